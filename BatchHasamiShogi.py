@@ -0,0 +1,207 @@
+# Description: A BatchHasamiShogi class is created to play thousands of Hasami Shogi games at once. The boards of every
+#              game are held in one (N, 9, 9) int8 NumPy array (0 empty, 1 black, 2 red) with arrays for the turn, the
+#              state and the number of pieces captured of each color. make_moves takes one start and one finish square
+#              per game (square = 9 * row + column) and applies the same rules as HasamiShogiGame.make_move to every
+#              game with array operations: the start, finish and diagonal checks, the path check, custodian captures
+#              in every direction including the corner captures, the 8 capture win check and the change of turn. Games
+#              whose move is invalid are left untouched, just like make_move returning False. cross_check plays random
+#              games on HasamiShogiGame and on a batch side by side and compares them after every move.
+
+import argparse
+import random
+
+import numpy as np
+
+from HasamiShogiGame import HasamiShogiGame, DIRECTION_STEPS, CORNER_PARTNERS, SQUARE_NAMES, SQUARE_INDEX, \
+    EMPTY_CELL, BLACK_CELL, RED_CELL, STATE_CODES, STATE_NAMES
+
+EDGE_CELL = -1                                          # stands for the squares beyond the edge of the board
+UNFINISHED, BLACK_WON, RED_WON = (STATE_CODES[name] for name in STATE_NAMES)
+PLAYER_NAMES = (None, "BLACK", "RED")
+
+
+def _build_ray_squares():
+    """Returns a (4, 81, 9) array of the squares met walking from each square in each direction, 81 past the edge."""
+    ray_squares = np.full((4, 81, 9), 81, dtype=np.intp)
+    for direction, (row_step, column_step) in enumerate(DIRECTION_STEPS):
+        for square in range(81):
+            row, column = divmod(square, 9)
+            for step in range(9):
+                row, column = row + row_step, column + column_step
+                if not (0 <= row <= 8 and 0 <= column <= 8):
+                    break
+                ray_squares[direction, square, step] = 9 * row + column
+    return ray_squares
+
+
+def _build_between_squares():
+    """Returns an (81, 81, 7) array of the squares strictly between two squares on a line, 81 for unused slots."""
+    between = np.full((81, 81, 7), 81, dtype=np.intp)
+    for start in range(81):
+        for direction in range(4):
+            for distance, finish in enumerate(RAY_SQUARES[direction, start]):
+                if finish == 81:
+                    break
+                between[start, finish, :distance] = RAY_SQUARES[direction, start, :distance]
+    return between
+
+
+def _build_corner_partner_squares():
+    """Returns a (4, 81) array of the partner square of a corner capture in each direction, 81 when there is none."""
+    partners = np.full((4, 81), 81, dtype=np.intp)
+    for direction in range(4):
+        for square in range(81):
+            if CORNER_PARTNERS[direction][square]:
+                partners[direction, square] = CORNER_PARTNERS[direction][square].bit_length() - 1
+    return partners
+
+
+RAY_SQUARES = _build_ray_squares()
+BETWEEN_SQUARES = _build_between_squares()
+CORNER_PARTNER_SQUARES = _build_corner_partner_squares()
+
+
+class BatchHasamiShogi:
+    """Represents many Hasami Shogi games played in lockstep on NumPy arrays."""
+
+    def __init__(self, num_games):
+        """Initialize all private data members with every game at the starting position."""
+        self._num_games = num_games
+        self._board = np.zeros((num_games, 9, 9), dtype=np.int8)
+        self._board[:, 0, :] = RED_CELL
+        self._board[:, 8, :] = BLACK_CELL
+        self._turn = np.full(num_games, BLACK_CELL, dtype=np.int8)
+        self._state = np.full(num_games, UNFINISHED, dtype=np.int8)
+        self._red_captured = np.zeros(num_games, dtype=np.int16)
+        self._black_captured = np.zeros(num_games, dtype=np.int16)
+
+    def make_moves(self, starts, finishes):
+        """Makes one move in every game and returns a boolean array telling which moves were valid."""
+        starts = np.asarray(starts, dtype=np.intp)
+        finishes = np.asarray(finishes, dtype=np.intp)
+        valid = BatchHasamiShogi._validate_moves(self, starts, finishes)
+        games = np.nonzero(valid)[0]
+        if games.size:
+            BatchHasamiShogi._apply_moves(self, games, starts[games], finishes[games])
+        return valid
+
+    def _padded_board(self, games, pad):
+        """Returns the flattened boards of the given games with an 82nd column holding pad."""
+        padded = np.full((games.size, 82), pad, dtype=np.int8)
+        padded[:, :81] = self._board.reshape(self._num_games, 81)[games]
+        return padded
+
+    def _validate_moves(self, starts, finishes):
+        """Returns which moves start on the mover's piece, end on an empty square in line and jump no piece."""
+        in_range = (starts >= 0) & (starts <= 80) & (finishes >= 0) & (finishes <= 80)
+        starts = np.where(in_range, starts, 0)
+        finishes = np.where(in_range, finishes, 0)
+        flat = self._board.reshape(self._num_games, 81)
+        games = np.arange(self._num_games)
+        valid = in_range & (self._state == UNFINISHED)
+        valid &= flat[games, starts] == self._turn
+        valid &= flat[games, finishes] == EMPTY_CELL
+        valid &= (starts // 9 == finishes // 9) | (starts % 9 == finishes % 9)
+        padded = BatchHasamiShogi._padded_board(self, games, EMPTY_CELL)
+        path = padded[games[:, None], BETWEEN_SQUARES[starts, finishes]]
+        valid &= ~np.any(path != EMPTY_CELL, axis=1)
+        return valid
+
+    def _apply_moves(self, games, starts, finishes):
+        """Moves the pieces of validated moves, removes captured pieces, checks for a win and passes the turn."""
+        flat = self._board.reshape(self._num_games, 81)
+        turn = self._turn[games]
+        opponent = 3 - turn
+        flat[games, starts] = EMPTY_CELL
+        flat[games, finishes] = turn
+        padded = BatchHasamiShogi._padded_board(self, games, EDGE_CELL)
+        rows = np.arange(games.size)[:, None]
+        num_captured = np.zeros(games.size, dtype=np.int16)
+        for direction in range(4):                      # the four rays from a square never share a square
+            ray = RAY_SQUARES[direction, finishes]      # (games, 9) squares walking away from the finish square
+            cells = padded[rows, ray]
+            is_opponent = cells == opponent[:, None]
+            run = np.argmin(is_opponent, axis=1)        # opponent pieces before the first other square
+            stop = cells[np.arange(games.size), run]
+            flanked = (run >= 1) & (stop == turn)
+            partner = padded[np.arange(games.size), CORNER_PARTNER_SQUARES[direction, finishes]]
+            cornered = (run == 1) & (stop == EDGE_CELL) & (partner == turn)     # lone piece in a corner
+            captures = (flanked | cornered)[:, None] & (np.arange(9)[None, :] < run[:, None])
+            capture_games, capture_steps = np.nonzero(captures)
+            flat[games[capture_games], ray[capture_games, capture_steps]] = EMPTY_CELL
+            num_captured += captures.sum(axis=1, dtype=np.int16)
+        black_moved = turn == BLACK_CELL
+        self._red_captured[games] += np.where(black_moved, num_captured, 0).astype(np.int16)
+        self._black_captured[games] += np.where(black_moved, 0, num_captured).astype(np.int16)
+        won = (self._red_captured[games] >= 8) | (self._black_captured[games] >= 8)
+        self._state[games[won]] = np.where(black_moved[won], BLACK_WON, RED_WON)
+        self._turn[games] = opponent
+
+    def get_board(self):
+        """Returns the (N, 9, 9) array of boards."""
+        return self._board
+
+    def get_game_states(self):
+        """Returns the array of game states (0 unfinished, 1 black won, 2 red won)."""
+        return self._state
+
+    def get_active_players(self):
+        """Returns the array of players whose turn it is (1 black, 2 red)."""
+        return self._turn
+
+    def get_num_captured_pieces(self, color):
+        """Returns the array of the number of pieces captured of the given color."""
+        if str(color).lower() == "black":
+            return self._black_captured
+        elif str(color).lower() == "red":
+            return self._red_captured
+
+    def matches_game(self, index, game):
+        """Returns True if the game at the given index is in exactly the same position as a HasamiShogiGame."""
+        occupants = {"NONE": EMPTY_CELL, "BLACK": BLACK_CELL, "RED": RED_CELL}
+        board = [occupants[game.get_square_occupant(name)] for name in SQUARE_NAMES]
+        return (board == self._board[index].reshape(81).tolist()
+                and STATE_NAMES[self._state[index]] == game.get_game_state()
+                and PLAYER_NAMES[self._turn[index]] == game.get_active_player()
+                and self._red_captured[index] == game.get_num_captured_pieces("RED")
+                and self._black_captured[index] == game.get_num_captured_pieces("BLACK"))
+
+
+def cross_check(num_games=200, num_moves=300, seed=0, invalid_rate=0.1):
+    """Plays random games on HasamiShogiGame and BatchHasamiShogi side by side, raising if they ever disagree."""
+    rng = random.Random(seed)
+    games = [HasamiShogiGame() for _ in range(num_games)]
+    batch = BatchHasamiShogi(num_games)
+    for ply in range(num_moves):
+        starts, finishes = [], []
+        for game in games:
+            moves = game.legal_moves()
+            if not moves or rng.random() < invalid_rate:    # also make sure bad moves are turned down the same way
+                starts.append(rng.randrange(81))
+                finishes.append(rng.randrange(81))
+            else:
+                start, finish = rng.choice(moves)
+                starts.append(SQUARE_INDEX[start])
+                finishes.append(SQUARE_INDEX[finish])
+        valid = batch.make_moves(starts, finishes)
+        for index, game in enumerate(games):
+            expected = game.make_move(SQUARE_NAMES[starts[index]], SQUARE_NAMES[finishes[index]])
+            if expected != bool(valid[index]) or not batch.matches_game(index, game):
+                raise AssertionError("game %d differs after move %d (%s-%s)"
+                                     % (index, ply, SQUARE_NAMES[starts[index]], SQUARE_NAMES[finishes[index]]))
+    return num_games * num_moves
+
+
+def main():
+    """Parses the command line and runs the cross-check against HasamiShogiGame."""
+    parser = argparse.ArgumentParser(description="Check BatchHasamiShogi against HasamiShogiGame move for move.")
+    parser.add_argument("--games", type=int, default=200, help="number of games played side by side")
+    parser.add_argument("--moves", type=int, default=300, help="moves attempted in every game")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random moves")
+    args = parser.parse_args()
+    num_checked = cross_check(args.games, args.moves, args.seed)
+    print("%d moves matched HasamiShogiGame" % num_checked)
+
+
+if __name__ == "__main__":
+    main()
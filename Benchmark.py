@@ -0,0 +1,229 @@
+# Description: Benchmarks for the HasamiShogiGame rules engine. A fixed corpus of random games is generated from a seed
+#              using only the public API, then replayed move by move on fresh games while the time is measured. Games
+#              are replayed headless, and again with the text renderer printing to os.devnull to show what drawing the
+#              board costs. Move generation is measured by asking for legal_moves after every move of the corpus and
+#              comparing it against probing all 81 x 81 square pairs with _validate_move, which is what callers had to
+#              do before legal_moves existed. Memory is measured with tracemalloc as the bytes held per live game, both
+#              fresh and part way through a game of the corpus with its legal moves cached, and per frozen snapshot of
+#              those same games. A second corpus is played greedily, always taking the move that captures the most, to
+#              weight the capture code, and perft is run on the Perft positions, which include the corner captures and
+#              captures of several pieces in every direction. Run with "python Benchmark.py" to print the results, add
+#              "--json results.json" to save them and "--compare results.json" to see how a later run differs.
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+from HasamiShogiGame import HasamiShogiGame, TextRenderer
+from Perft import POSITIONS, load_position, perft
+
+ROW_LABELS = "abcdefghi"
+COLUMN_LABELS = "123456789"
+
+
+def square_name(row, column):
+    """Returns the algebraic notation for the given row and column indices."""
+    return ROW_LABELS[row] + COLUMN_LABELS[column]
+
+
+def generate_corpus(num_games, seed=0, max_attempts=2000):
+    """Plays random games through make_move and returns the accepted moves of each game as lists of square pairs."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(num_games):
+        game = HasamiShogiGame()
+        moves = []
+        for _ in range(max_attempts):
+            if game.get_game_state() != "UNFINISHED":
+                break
+            player = game.get_active_player()
+            own_squares = [(row, column) for row in range(9) for column in range(9)
+                           if game.get_square_occupant(square_name(row, column)) == player]
+            row, column = rng.choice(own_squares)
+            if rng.random() < 0.5:
+                finish = square_name(row, rng.randrange(9))
+            else:
+                finish = square_name(rng.randrange(9), column)
+            start = square_name(row, column)
+            if game.make_move(start, finish):
+                moves.append((start, finish))
+        corpus.append(moves)
+    return corpus
+
+
+def generate_capture_corpus(num_games, seed=0, max_moves=300):
+    """Plays games that always take the move capturing the most pieces and returns their moves, like generate_corpus."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(num_games):
+        game = HasamiShogiGame()
+        moves = []
+        while game.get_game_state() == "UNFINISHED" and len(moves) < max_moves:
+            opponent = "RED" if game.get_active_player() == "BLACK" else "BLACK"
+            best_moves, best_count = [], -1
+            for start, finish in game.legal_moves():    # try every move and take it back to count its captures
+                before = game.get_num_captured_pieces(opponent)
+                game.push_move(start, finish)
+                count = game.get_num_captured_pieces(opponent) - before
+                game.pop_move()
+                if count > best_count:
+                    best_moves, best_count = [(start, finish)], count
+                elif count == best_count:
+                    best_moves.append((start, finish))
+            if not best_moves:
+                break
+            start, finish = rng.choice(best_moves)
+            game.make_move(start, finish)
+            moves.append((start, finish))
+        corpus.append(moves)
+    return corpus
+
+
+def replay_corpus(corpus, renderer=None):
+    """Replays every game in the corpus on a fresh HasamiShogiGame and returns the number of moves applied."""
+    num_moves = 0
+    for moves in corpus:
+        game = HasamiShogiGame(renderer)
+        for start, finish in moves:
+            game.make_move(start, finish)
+        num_moves += len(moves)
+    return num_moves
+
+
+def bench_make_move(corpus, repeat=3, renderer=None):
+    """Returns the best moves per second measured over several replays of the corpus."""
+    best = 0.0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            num_moves = replay_corpus(corpus, renderer)
+            elapsed = time.perf_counter() - start_time
+            best = max(best, num_moves / elapsed)
+    return best
+
+
+def brute_force_moves(game):
+    """Returns the legal moves of a game found by running _validate_move on every pair of squares."""
+    moves = []
+    for start in range(81):
+        for finish in range(81):
+            if game._validate_move(start, finish) is True:
+                moves.append((square_name(*divmod(start, 9)), square_name(*divmod(finish, 9))))
+    return moves
+
+
+def bench_legal_moves(corpus, sample_every=10):
+    """Returns the positions per second of legal_moves and of brute force probing over positions of the corpus."""
+    legal_time = brute_time = 0.0
+    num_positions = 0
+    for moves in corpus:
+        game = HasamiShogiGame()
+        for ply, (start, finish) in enumerate(moves):
+            game.make_move(start, finish)
+            start_time = time.perf_counter()
+            legal = game.legal_moves()
+            legal_time += time.perf_counter() - start_time
+            if ply % sample_every:
+                continue
+            start_time = time.perf_counter()
+            brute = brute_force_moves(game)
+            brute_time += time.perf_counter() - start_time
+            num_positions += 1
+            if sorted(legal) != sorted(brute):
+                raise AssertionError("legal_moves disagrees with _validate_move after %s-%s" % (start, finish))
+    num_legal_calls = sum(len(moves) for moves in corpus)
+    return num_legal_calls / legal_time, num_positions / brute_time
+
+
+def bench_perft(depth=3):
+    """Returns the perft node count and nodes per second of every position in Perft.POSITIONS."""
+    results = {}
+    for name in POSITIONS:
+        game = load_position(name)
+        start_time = time.perf_counter()
+        nodes = perft(game, depth)
+        results[name] = nodes, nodes / (time.perf_counter() - start_time)
+    return results
+
+
+def traced_bytes_per_item(make_items):
+    """Returns the memory allocated by make_items and still held when it returns, divided by the items it made."""
+    tracemalloc.start()
+    try:
+        items = make_items()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return held / len(items)
+
+
+def bench_memory(corpus, num_fresh=10000):
+    """Returns the bytes held per fresh game, per game part way through the corpus and per frozen snapshot of those."""
+    def play_halfway():
+        games = []
+        for moves in corpus:
+            game = HasamiShogiGame()
+            for start, finish in moves[:len(moves) // 2]:
+                game.make_move(start, finish)
+            game.legal_moves()                          # fill the move caches like a game being searched would
+            games.append(game)
+        return games
+    fresh_bytes = traced_bytes_per_item(lambda: [HasamiShogiGame() for _ in range(num_fresh)])
+    played_bytes = traced_bytes_per_item(play_halfway)
+    games = play_halfway()
+    frozen_bytes = traced_bytes_per_item(lambda: [game.freeze() for game in games])
+    return fresh_bytes, played_bytes, frozen_bytes
+
+
+def main():
+    """Parses the command line, prints the benchmark results and optionally saves or compares them as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark the HasamiShogiGame rules engine.")
+    parser.add_argument("--games", type=int, default=50, help="number of random games in the corpus")
+    parser.add_argument("--seed", type=int, default=0, help="seed used to generate the corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed replays, the best one is kept")
+    parser.add_argument("--perft-depth", type=int, default=3, help="depth of the perft runs")
+    parser.add_argument("--json", default=None, help="file to save the results to")
+    parser.add_argument("--compare", default=None, help="results saved by an earlier run to compare against")
+    args = parser.parse_args()
+    results = {"python": platform.python_version(), "games": args.games, "seed": args.seed}
+    corpus = generate_corpus(args.games, args.seed)
+    capture_corpus = generate_capture_corpus(args.games, args.seed)
+    for name, games in (("random", corpus), ("capture", capture_corpus)):
+        num_moves = sum(len(moves) for moves in games)
+        print("%s corpus: %d games, %d moves" % (name, len(games), num_moves))
+        results[name + "_make_move_per_sec"] = bench_make_move(games, args.repeat)
+        print("  make_move (headless): %.0f moves/sec" % results[name + "_make_move_per_sec"])
+    results["text_make_move_per_sec"] = bench_make_move(corpus, args.repeat, TextRenderer())
+    print("make_move (text renderer): %.0f moves/sec" % results["text_make_move_per_sec"])
+    legal_rate, brute_rate = bench_legal_moves(corpus)
+    results["legal_moves_per_sec"], results["brute_force_per_sec"] = legal_rate, brute_rate
+    print("legal_moves: %.0f positions/sec, brute force probing: %.1f positions/sec (%.0fx)"
+          % (legal_rate, brute_rate, legal_rate / brute_rate))
+    for name, (nodes, rate) in bench_perft(args.perft_depth).items():
+        results["perft_%s_nodes" % name], results["perft_%s_per_sec" % name] = nodes, rate
+        print("perft(%d) %s: %d nodes, %.0f nodes/sec" % (args.perft_depth, name, nodes, rate))
+    fresh_bytes, played_bytes, frozen_bytes = bench_memory(corpus)
+    results["fresh_bytes"], results["played_bytes"], results["frozen_bytes"] = fresh_bytes, played_bytes, frozen_bytes
+    print("memory: %.0f bytes per fresh game, %.0f bytes per game in play, %.0f bytes per frozen game"
+          % (fresh_bytes, played_bytes, frozen_bytes))
+    if args.compare is not None:
+        with open(args.compare) as previous_file:
+            previous = json.load(previous_file)
+        print("compared with %s:" % args.compare)
+        for key, value in results.items():
+            if isinstance(value, float) and previous.get(key):
+                print("  %s: %.4g -> %.4g (%+.1f%%)" % (key, previous[key], value, 100 * (value / previous[key] - 1)))
+            elif key.endswith("_nodes") and key in previous and previous[key] != value:
+                print("  %s: %d -> %d NODE COUNT CHANGED" % (key, previous[key], value))
+    if args.json is not None:
+        with open(args.json, "w") as results_file:
+            json.dump(results, results_file, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# Description: A compact, append-only archive format for Hasami Shogi games. A move is stored as two bytes, the
+#              numbers (9 * row + column) of its start and finish squares. Each game is one record in the data file: a
+#              4-byte header holding the number of moves, the final state and whether the game started from a position
+#              other than the usual one, then that 24-byte position (from HasamiShogiGame.to_bytes) when there is one,
+#              then the moves. Next to the data file, an index file holds the 8-byte offset of every record, so the
+#              GameArchiveReader can memory-map both files and fetch any game directly without reading the ones before
+#              it. Run "python GameArchive.py append games.hsga < results.jsonl" to store SelfPlay results, and
+#              "python GameArchive.py show games.hsga 12" to print one game.
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+from HasamiShogiGame import HasamiShogiGame, SQUARE_NAMES, SQUARE_INDEX, STATE_CODES, STATE_NAMES, POSITION_BYTES
+
+MAGIC = b"HSGA\x01"                                     # file type and format version at the start of the data file
+RECORD_HEADER = struct.Struct("<HBx")                   # number of moves, flags (state in bits 0-1, start position)
+OFFSET = struct.Struct("<Q")
+CUSTOM_START = 4                                        # flag set when the record stores its starting position
+
+
+def encode_move(start, finish):
+    """Returns the two bytes encoding a move given in algebraic notation."""
+    return bytes((SQUARE_INDEX[start], SQUARE_INDEX[finish]))
+
+
+def decode_move(data):
+    """Returns the (start, finish) pair in algebraic notation encoded in two bytes."""
+    return SQUARE_NAMES[data[0]], SQUARE_NAMES[data[1]]
+
+
+def index_path(path):
+    """Returns the path of the offset index kept next to an archive."""
+    return path + ".idx"
+
+
+class GameArchiveWriter:
+    """Appends games to an archive and its offset index."""
+
+    def __init__(self, path):
+        """Initialize all private data members, creating the archive if it doesn't exist yet."""
+        self._data = open(path, "ab")
+        self._index = open(index_path(path), "ab")
+        if self._data.tell() == 0:
+            self._data.write(MAGIC)
+        self._num_games = self._index.tell() // OFFSET.size
+
+    def append(self, moves, state="UNFINISHED", start_position=None):
+        """Appends a game given as (start, finish) pairs and returns its number in the archive."""
+        flags = STATE_CODES[state]
+        record = bytearray()
+        if start_position is not None:
+            flags |= CUSTOM_START
+            record += start_position
+        for start, finish in moves:
+            record += encode_move(start, finish)
+        offset = self._data.tell()
+        self._data.write(RECORD_HEADER.pack(len(moves), flags) + record)
+        self._data.flush()                              # the record is on disk before any index entry points at it
+        self._index.write(OFFSET.pack(offset))
+        self._index.flush()
+        self._num_games += 1
+        return self._num_games - 1
+
+    def close(self):
+        """Flushes and closes the archive."""
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        """Returns the archive for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the archive at the end of a with statement."""
+        self.close()
+
+
+class GameArchiveReader:
+    """Reads games from an archive through memory maps of the archive and its offset index."""
+
+    def __init__(self, path):
+        """Initialize all private data members and map both files into memory."""
+        self._data_file = open(path, "rb")
+        self._index_file = open(index_path(path), "rb")
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a Hasami Shogi game archive" % path)
+        index_size = os.fstat(self._index_file.fileno()).st_size
+        self._num_games = index_size // OFFSET.size
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ) if index_size else b""
+
+    def __len__(self):
+        """Returns the number of games in the archive."""
+        return self._num_games
+
+    def get_game(self, number):
+        """Returns the moves, final state and starting position (None for the usual one) of a game."""
+        if not 0 <= number < self._num_games:
+            raise IndexError("game %d is not in the archive" % number)
+        offset = OFFSET.unpack_from(self._index, number * OFFSET.size)[0]
+        num_moves, flags = RECORD_HEADER.unpack_from(self._data, offset)
+        offset += RECORD_HEADER.size
+        start_position = None
+        if flags & CUSTOM_START:
+            start_position = self._data[offset:offset + POSITION_BYTES]
+            offset += POSITION_BYTES
+        move_bytes = self._data[offset:offset + 2 * num_moves]
+        moves = [(SQUARE_NAMES[move_bytes[index]], SQUARE_NAMES[move_bytes[index + 1]])
+                 for index in range(0, len(move_bytes), 2)]
+        return moves, STATE_NAMES[flags & 3], start_position
+
+    def get_moves(self, number):
+        """Returns the moves of a game as (start, finish) pairs."""
+        return GameArchiveReader.get_game(self, number)[0]
+
+    def replay(self, number, renderer=None):
+        """Returns a HasamiShogiGame with every move of a game made."""
+        moves, _, start_position = GameArchiveReader.get_game(self, number)
+        if start_position is None:
+            game = HasamiShogiGame(renderer)
+        else:
+            game = HasamiShogiGame.from_bytes(start_position, renderer)
+        for start, finish in moves:
+            game.make_move(start, finish)
+        return game
+
+    def __iter__(self):
+        """Yields the moves, final state and starting position of every game in order."""
+        for number in range(self._num_games):
+            yield GameArchiveReader.get_game(self, number)
+
+    def close(self):
+        """Unmaps and closes both files."""
+        if isinstance(self._index, mmap.mmap):          # also mapped when it only holds part of an entry
+            self._index.close()
+        self._data.close()
+        self._data_file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        """Returns the archive for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the archive at the end of a with statement."""
+        self.close()
+
+
+def main():
+    """Parses the command line and appends games to, or prints games from, an archive."""
+    parser = argparse.ArgumentParser(description="Store and read Hasami Shogi games in a compact archive.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    append_parser = commands.add_parser("append", help="append SelfPlay JSON results read from stdin")
+    append_parser.add_argument("archive")
+    show_parser = commands.add_parser("show", help="print the moves and final board of one game")
+    show_parser.add_argument("archive")
+    show_parser.add_argument("number", type=int)
+    args = parser.parse_args()
+    if args.command == "append":
+        with GameArchiveWriter(args.archive) as writer:
+            for line in sys.stdin:
+                result = json.loads(line)
+                writer.append([(move[:2], move[2:]) for move in result["moves"]], result["state"])
+    else:
+        with GameArchiveReader(args.archive) as reader:
+            moves, state, _ = reader.get_game(args.number)
+            print(" ".join(start + "-" + finish for start, finish in moves))
+            print(reader.replay(args.number).get_board_text())
+            print(state)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+# Description: A GameServer class is created to host many HasamiShogiGame sessions at once from a single asyncio event
+#              loop, over TCP or a Unix socket. Clients speak a line protocol, one command per line and one reply line
+#              per command, starting with "OK" or "ERR" (or "ILLEGAL" for a move that make_move turned down): "NEW",
+#              "MOVE <game> <start> <finish>", "MOVES <game>", "STATE <game>", "OCCUPANT <game> <square>", "CAPTURED
+#              <game> <color>", "END <game>" and "STATS". Sessions are not tied to a connection, so any connection may
+#              play any game. Sessions left idle longer than the freeze timeout are frozen into 24-byte snapshots and
+#              thawed again when next used, and sessions left idle longer than the idle timeout are evicted, oldest
+#              first, and once the session limit is reached NEW is turned down until sessions end or are evicted. Every
+#              reply waits for the connection's write buffer to drain, so a client that pipelines commands faster than
+#              it reads replies is paused rather than growing the server's memory. "python GameServer.py serve" runs the
+#              server, and "python GameServer.py load" runs a load generator that holds many sessions open across a few
+#              connections, plays random legal moves in all of them and reports the p50 and p99 move latency. With
+#              --metrics-port the server also answers HTTP requests on that port with its statistics in Prometheus text
+#              format, and with --profile those include the time spent in each phase of the rules engine.
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+
+from HasamiShogiGame import HasamiShogiGame
+from Profiling import PhaseProfiler
+
+MAX_LINE_BYTES = 1024                                   # longest command line accepted from a client
+GAME_COMMAND_WORDS = {"MOVE": 4, "MOVES": 2, "STATE": 2, "OCCUPANT": 3, "CAPTURED": 3, "END": 2}    # with game number
+MIN_SWEEP_SECONDS = 0.05                                # shortest wait between sweeps for idle sessions
+
+
+class GameServer:
+    """Represents a server hosting many Hasami Shogi games on one event loop."""
+
+    def __init__(self, idle_timeout=300.0, max_sessions=100000, freeze_timeout=30.0, profiler=None):
+        """Initialize all private data members. Timeouts are in seconds, and a profiler's counters join the metrics."""
+        self._idle_timeout = idle_timeout
+        self._freeze_timeout = freeze_timeout
+        self._max_sessions = max_sessions
+        self._sessions = OrderedDict()                  # game number -> [game, last use], least recently used first
+        self._next_id = 0
+        self._peak_sessions = 0
+        self._num_moves = 0
+        self._num_evicted = 0
+        self._num_frozen = 0
+        self._num_connections = 0
+        self._profiler = profiler
+        self._server = None
+        self._metrics_server = None
+        self._evictor = None
+
+    async def start(self, host="127.0.0.1", port=8765, path=None, metrics_port=None):
+        """Starts listening on a TCP port, or on a Unix socket when a path is given, and for metrics scrapes."""
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path, limit=MAX_LINE_BYTES)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_LINE_BYTES)
+        if metrics_port is not None:
+            self._metrics_server = await asyncio.start_server(self._handle_metrics, host, metrics_port)
+        self._evictor = asyncio.get_running_loop().create_task(GameServer._evict_idle_sessions(self))
+        return self._server
+
+    async def serve_forever(self):
+        """Serves clients until the server is closed."""
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Stops listening and stops evicting sessions."""
+        if self._evictor is not None:
+            self._evictor.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+            await self._metrics_server.wait_closed()
+
+    def get_stats(self):
+        """Returns the number of open, peak and frozen sessions, moves made, sessions evicted and connections open."""
+        return {"sessions": len(self._sessions), "peak_sessions": self._peak_sessions, "frozen": self._num_frozen,
+                "moves": self._num_moves, "evicted": self._num_evicted, "connections": self._num_connections}
+
+    def get_metrics_text(self):
+        """Returns the server statistics, and the profiler's counters if there is one, as Prometheus text."""
+        lines = []
+        for name, value in GameServer.get_stats(self).items():
+            kind = "counter" if name in ("moves", "evicted") else "gauge"
+            metric = "hasami_shogi_server_%s%s" % (name, "_total" if kind == "counter" else "")
+            lines += ["# TYPE %s %s" % (metric, kind), "%s %d" % (metric, value)]
+        text = "\n".join(lines) + "\n"
+        if self._profiler is not None:
+            text += self._profiler.to_prometheus()
+        return text
+
+    async def _handle_metrics(self, reader, writer):
+        """Answers one HTTP request on the metrics port with the metrics text, whatever the path."""
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = GameServer.get_metrics_text(self).encode()
+            writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: %d\r\n\r\n"
+                         % len(body) + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_connection(self, reader, writer):
+        """Answers the commands of one connection until it closes."""
+        self._num_connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:                      # line longer than MAX_LINE_BYTES, the stream can't recover
+                    writer.write(b"ERR line too long\n")
+                    break
+                if not line:
+                    break
+                writer.write(GameServer.handle_command(self, line.decode("utf-8", "replace")).encode() + b"\n")
+                await writer.drain()                    # pause this client until it reads its replies
+        except ConnectionError:
+            pass
+        finally:
+            self._num_connections -= 1
+            writer.close()
+
+    def handle_command(self, line):
+        """Carries out one command line and returns the reply line without its newline."""
+        words = line.split()
+        if not words:
+            return "ERR empty command"
+        command = words[0].upper()
+        if command == "NEW":
+            return GameServer._new_session(self)
+        if command == "STATS":
+            return "OK " + " ".join("%s=%d" % item for item in GameServer.get_stats(self).items())
+        if command not in GAME_COMMAND_WORDS:
+            return "ERR bad command"
+        if len(words) < 2:
+            return "ERR missing game number"
+        if len(words) != GAME_COMMAND_WORDS[command]:    # checked before the session counts as used
+            return "ERR bad command"
+        if command == "CAPTURED" and words[2].upper() not in ("RED", "BLACK"):
+            return "ERR bad command"
+        session = self._sessions.get(words[1])
+        if session is None:
+            return "ERR no such game"
+        if command == "END":
+            del self._sessions[words[1]]
+            if session[0].__class__ is bytes:
+                self._num_frozen -= 1
+            return "OK"
+        self._sessions.move_to_end(words[1])
+        session[1] = time.monotonic()
+        game = session[0]
+        if game.__class__ is bytes:                     # frozen while idle, bring it back to life
+            game = session[0] = HasamiShogiGame.thaw(game)
+            self._num_frozen -= 1
+        if command == "MOVE":
+            if game.make_move(words[2], words[3]):
+                self._num_moves += 1
+                return "OK"
+            return "ILLEGAL"
+        if command == "MOVES":
+            return " ".join(["OK"] + [start + finish for start, finish in game.iter_legal_moves()])
+        if command == "STATE":
+            return "OK %s %s" % (game.get_game_state(), game.get_active_player())
+        if command == "OCCUPANT":
+            occupant = game.get_square_occupant(words[2])
+            return "ERR bad square" if occupant is None else "OK " + occupant
+        return "OK %d" % game.get_num_captured_pieces(words[2].upper())
+
+    def _new_session(self):
+        """Starts a new game and returns the reply giving its number, or an error when the server is full."""
+        if len(self._sessions) >= self._max_sessions:
+            return "ERR busy"
+        game_id = str(self._next_id)
+        self._next_id += 1
+        self._sessions[game_id] = [HasamiShogiGame(), time.monotonic()]
+        self._peak_sessions = max(self._peak_sessions, len(self._sessions))
+        return "OK " + game_id
+
+    async def _evict_idle_sessions(self):
+        """Removes sessions unused within the idle timeout and freezes those unused within the freeze timeout."""
+        while True:
+            await asyncio.sleep(max(min(self._idle_timeout, self._freeze_timeout) / 4, MIN_SWEEP_SECONDS))
+            now = time.monotonic()
+            while self._sessions:
+                game_id, (game, last_use) = next(iter(self._sessions.items()))
+                if last_use >= now - self._idle_timeout:    # sessions are kept in order of use, the rest are newer
+                    break
+                del self._sessions[game_id]
+                self._num_evicted += 1
+                if game.__class__ is bytes:
+                    self._num_frozen -= 1
+            for session in self._sessions.values():
+                if session[1] >= now - self._freeze_timeout:
+                    break
+                if session[0].__class__ is not bytes:
+                    session[0] = session[0].freeze()
+                    self._num_frozen += 1
+
+
+async def _request(reader, writer, line):
+    """Sends one command line and returns the reply line."""
+    writer.write(line.encode() + b"\n")
+    return (await reader.readline()).decode().rstrip("\n")
+
+
+async def _load_connection(connect, num_sessions, num_moves, rng, latencies):
+    """Opens sessions on one connection and plays random legal moves in them in turn, timing every move."""
+    reader, writer = await connect()
+    game_ids = []
+    for _ in range(num_sessions):
+        reply = await _request(reader, writer, "NEW")
+        if not reply.startswith("OK "):
+            break
+        game_ids.append(reply[3:])
+    for _ in range(num_moves):
+        for game_id in list(game_ids):
+            moves = (await _request(reader, writer, "MOVES " + game_id)).split()[1:]
+            if not moves:                               # game over or no legal move, this session is done
+                game_ids.remove(game_id)
+                continue
+            move = rng.choice(moves)
+            start_time = time.perf_counter()
+            await _request(reader, writer, "MOVE %s %s %s" % (game_id, move[:2], move[2:]))
+            latencies.append(time.perf_counter() - start_time)
+    stats = await _request(reader, writer, "STATS")
+    for game_id in game_ids:
+        await _request(reader, writer, "END " + game_id)
+    writer.close()
+    return stats
+
+
+async def run_load(host="127.0.0.1", port=8765, path=None, connections=10, sessions=1000, moves=20, seed=0):
+    """Plays random games against a running server and returns the move latencies and server statistics."""
+    if path is not None:
+        def connect():
+            return asyncio.open_unix_connection(path, limit=1 << 16)
+    else:
+        def connect():
+            return asyncio.open_connection(host, port, limit=1 << 16)
+    rng = random.Random(seed)
+    latencies = []
+    start_time = time.perf_counter()
+    per_connection = [sessions // connections + (index < sessions % connections) for index in range(connections)]
+    replies = await asyncio.gather(*[_load_connection(connect, num_sessions, moves, random.Random(rng.random()),
+                                                      latencies) for num_sessions in per_connection])
+    elapsed = time.perf_counter() - start_time
+    server_stats = dict(item.split("=") for item in replies[0].split()[1:]) if replies else {}
+    latencies.sort()
+    return {"moves": len(latencies),
+            "seconds": elapsed,
+            "moves_per_second": len(latencies) / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            "p99_ms": latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000 if latencies else 0.0,
+            "peak_sessions": int(server_stats.get("peak_sessions", 0))}
+
+
+def main():
+    """Parses the command line and runs the server or the load generator."""
+    parser = argparse.ArgumentParser(description="Host Hasami Shogi games over a line protocol, or load test a host.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("serve", "run the game server"), ("load", "play random games against a running server")):
+        command_parser = commands.add_parser(name, help=help_text)
+        command_parser.add_argument("--host", default="127.0.0.1")
+        command_parser.add_argument("--port", type=int, default=8765)
+        command_parser.add_argument("--unix", default=None, help="path of a Unix socket to use instead of TCP")
+    commands.choices["serve"].add_argument("--idle-timeout", type=float, default=300.0,
+                                           help="seconds after which an unused session is evicted")
+    commands.choices["serve"].add_argument("--freeze-timeout", type=float, default=30.0,
+                                           help="seconds after which an unused session is frozen to save memory")
+    commands.choices["serve"].add_argument("--metrics-port", type=int, default=None,
+                                           help="port serving Prometheus metrics over HTTP")
+    commands.choices["serve"].add_argument("--profile", action="store_true",
+                                           help="time each phase of every move and add it to the metrics")
+    commands.choices["serve"].add_argument("--max-sessions", type=int, default=100000,
+                                           help="sessions allowed at once before NEW is turned down")
+    commands.choices["load"].add_argument("--connections", type=int, default=10, help="client connections")
+    commands.choices["load"].add_argument("--sessions", type=int, default=1000, help="sessions held open at once")
+    commands.choices["load"].add_argument("--moves", type=int, default=20, help="moves played in every session")
+    commands.choices["load"].add_argument("--seed", type=int, default=0, help="seed for the random moves")
+    args = parser.parse_args()
+    if args.command == "serve":
+        if args.idle_timeout <= 0 or args.freeze_timeout <= 0:
+            parser.error("--idle-timeout and --freeze-timeout must be more than 0 seconds")
+        profiler = PhaseProfiler() if args.profile else None
+        if profiler is not None:
+            profiler.enable()
+        server = GameServer(args.idle_timeout, args.max_sessions, args.freeze_timeout, profiler)
+
+        async def serve():
+            await server.start(args.host, args.port, args.unix, args.metrics_port)
+            await server.serve_forever()
+        asyncio.run(serve())
+    else:
+        result = asyncio.run(run_load(args.host, args.port, args.unix, args.connections, args.sessions, args.moves,
+                                      args.seed))
+        print("%d moves in %.2f s (%.0f moves/sec), move latency p50 %.2f ms, p99 %.2f ms"
+              % (result["moves"], result["seconds"], result["moves_per_second"], result["p50_ms"], result["p99_ms"]))
+        print("%d sessions held at once on the server's single event loop (one core), %d cores on this machine"
+              % (result["peak_sessions"], os.cpu_count() or 1))
+
+
+if __name__ == "__main__":
+    main()
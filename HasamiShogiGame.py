@@ -14,82 +14,409 @@
 #              squares on the board are made blank. When no captures are possible or all possible captures have been
 #              made, there is a check to see if a winner has been found by looking at the number of pieces captured.
 #              Whoever has had 8 or more pieces captured is the loser. If game has been won, the state of the game is
-#              updated, and if not only the turn will be updated.
+#              updated, and if not only the turn will be updated. The board itself is stored as two 81-bit integers (one
+#              per color, bit 9 * row + column set when a piece occupies that square), so path and capture checks are
+#              done with precomputed rank, file and ray masks rather than by comparing squares one at a time. Legal
+#              moves are generated from tables of sliding targets indexed by the occupancy of a rank or file, and the
+#              moves along each rank and file are cached and only regenerated for lines touched by a move or capture.
+#              push_move and pop_move make and unmake moves through a stack of compact undo records so that positions
+#              can be explored without copying the game. A 64-bit Zobrist hash of the pieces and the player to move is
+#              updated as pieces move and are captured. Drawing the board is left to an optional renderer: none at all
+#              (headless, the default), a text renderer that prints the board after every move, or a buffered renderer
+#              that only builds the text when asked. to_bytes and from_bytes save and load a position in 24 bytes: 2
+#              bits per square, then the turn and state, then the number of pieces captured of each color. Squares are
+#              looked up in a table holding every spelling of "a1" to "i9" in either case, so malformed input makes
+#              make_move return False instead of raising, and make_move_idx takes square numbers directly, as ints or
+#              anything that can stand in for one, such as a NumPy integer. The start and finish squares are passed from
+#              helper to helper rather than stored on the game, so nothing about a move in progress is left behind on
+#              the instance. To keep hundreds of thousands of idle games in memory cheaply, the class uses __slots__,
+#              the printed board is a bytearray of one cell code per square, lookup tables and move tuples are shared at
+#              module level, and the move caches are only made once moves are asked for. freeze turns a game into an
+#              immutable 24-byte snapshot and thaw brings it back as a live game. A threat map records, for each empty
+#              square and each color, the pieces a piece of that color landing there would capture. Like the move
+#              caches, it is only brought up to date for the ranks and files changed since it was last used (and the
+#              squares next to the corners, whose corner captures depend on squares off their lines), so
+#              capturing_moves, capture_count and threatened_squares answer without trying every move.
+
+import operator
+import random
+
+EMPTY = "・"
+BLACK_PIECE = "歩"
+RED_PIECE = "と"
+EMPTY_CELL, BLACK_CELL, RED_CELL = 0, 1, 2                  # codes of the squares in the board bytearray
+CELL_TEXT = (EMPTY, BLACK_PIECE, RED_PIECE)               # character printed for each cell code
+ROW_TEXT = {}                                           # printed text of each row of cells seen, at most 3 ** 9 rows
+STARTING_CELLS = bytes([RED_CELL] * 9 + [EMPTY_CELL] * 63 + [BLACK_CELL] * 9)
+
+UP, DOWN, LEFT, RIGHT = 0, 1, 2, 3
+DIRECTION_STEPS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+SQUARE_BITS = tuple(1 << square for square in range(81))
+RANK_MASKS = tuple(0x1FF << (9 * row) for row in range(9))
+FILE_MASKS = tuple(sum(1 << (9 * row + column) for row in range(9)) for column in range(9))
+
+
+def _build_ray_masks():
+    """Returns, for each direction and square, the mask of every square from that square (exclusive) to the edge."""
+    ray_masks = []
+    for row_step, column_step in DIRECTION_STEPS:
+        direction_rays = []
+        for square in range(81):
+            row, column = divmod(square, 9)
+            mask = 0
+            row, column = row + row_step, column + column_step
+            while 0 <= row <= 8 and 0 <= column <= 8:
+                mask |= 1 << (9 * row + column)
+                row, column = row + row_step, column + column_step
+            direction_rays.append(mask)
+        ray_masks.append(tuple(direction_rays))
+    return tuple(ray_masks)
+
+
+def _build_corner_partners():
+    """Returns, for each direction and square, the partner square bit needed for a corner capture in that direction."""
+    corner_partners = []
+    for row_step, column_step in DIRECTION_STEPS:
+        direction_partners = []
+        for square in range(81):
+            row, column = divmod(square, 9)
+            corner_row, corner_column = row + row_step, column + column_step
+            if corner_row not in (0, 8) or corner_column not in (0, 8):
+                direction_partners.append(0)
+            elif row_step:                              # corner reached along a column, partner sits in its row
+                direction_partners.append(1 << (9 * corner_row + (1 if corner_column == 0 else 7)))
+            else:                                       # corner reached along a row, partner sits in its column
+                direction_partners.append(1 << (9 * (1 if corner_row == 0 else 7) + corner_column))
+        corner_partners.append(tuple(direction_partners))
+    return tuple(corner_partners)
+
+
+def _nearest_bit(direction, ray):
+    """Returns the bit of the square in the ray that is closest to the square the ray starts from."""
+    if direction == UP or direction == LEFT:            # ray runs towards lower square numbers
+        return 1 << (ray.bit_length() - 1) if ray else 0
+    return ray & -ray
+
+
+RAY_MASKS = _build_ray_masks()
+NEIGHBOR_BITS = tuple(tuple(_nearest_bit(direction, ray) for ray in RAY_MASKS[direction]) for direction in range(4))
+ADJACENT_MASKS = tuple(NEIGHBOR_BITS[UP][square] | NEIGHBOR_BITS[DOWN][square] | NEIGHBOR_BITS[LEFT][square] |
+                       NEIGHBOR_BITS[RIGHT][square] for square in range(81))
+CORNER_PARTNERS = _build_corner_partners()
+CORNER_NEIGHBORS = sum(SQUARE_BITS[square] for square in range(81)
+                       if any(CORNER_PARTNERS[direction][square] for direction in range(4)))
+LINE_MASKS = RANK_MASKS + FILE_MASKS                    # ranks are lines 0-8, files 9-17
+BOARD_MASK = (1 << 81) - 1
+
+
+def _build_slide_targets():
+    """Returns, for each position on a line and each 9-bit occupancy of that line, the positions a piece can reach."""
+    slide_targets = []
+    for position in range(9):
+        position_targets = []
+        for occupancy in range(512):
+            targets = []
+            for step in (-1, 1):
+                target = position + step
+                while 0 <= target <= 8 and not occupancy >> target & 1:
+                    targets.append(target)
+                    target += step
+            position_targets.append(tuple(targets))
+        slide_targets.append(tuple(position_targets))
+    return tuple(slide_targets)
+
+
+SLIDE_TARGETS = _build_slide_targets()
+LINE_SQUARES = tuple(tuple(9 * row + column for column in range(9)) for row in range(9)) + \
+    tuple(tuple(9 * row + column for row in range(9)) for column in range(9))   # ranks are lines 0-8, files 9-17
+FILE_GATHER = sum(1 << (72 - 8 * row) for row in range(9))     # moves bit 9 * row of a file mask to bit 72 + row
+SQUARE_LINES = tuple(1 << (square // 9) | 1 << (9 + square % 9) for square in range(81))    # rank and file bits
+SQUARE_PAIRS = tuple(tuple((start, finish) for finish in range(81)) for start in range(81))   # shared move tuples
+SQUARE_NAMES = tuple(row_name + column_name for row_name in "abcdefghi" for column_name in "123456789")
+SQUARE_INDEX = {name: square for square, name in enumerate(SQUARE_NAMES)}
+SQUARE_INDEX.update({name.upper(): square for square, name in enumerate(SQUARE_NAMES)})     # "a1" and "A1" -> 0
+STATE_CODES = {"UNFINISHED": 0, "BLACK_WON": 1, "RED_WON": 2}
+STATE_NAMES = ("UNFINISHED", "BLACK_WON", "RED_WON")
+POSITION_BYTES = 24
+UNPACKED_BYTE = tuple(bytes(byte >> shift & 3 for shift in (0, 2, 4, 6)) for byte in range(256))  # 4 cells per byte
+BLACK_DIGITS = bytes.maketrans(b"\x00\x01\x02", b"010")    # cell codes to "1" where black, "0" elsewhere
+RED_DIGITS = bytes.maketrans(b"\x00\x01\x02", b"001")
+SPREAD_BYTE = tuple(sum((byte >> bit & 1) << (2 * bit) for bit in range(8)) for byte in range(256))    # bit i -> 2i
+
+
+def parse_square(notation):
+    """Returns the number (9 * row + column) of a square in algebraic notation such as "b3" or "B3", or None."""
+    try:
+        return SQUARE_INDEX.get(notation)
+    except TypeError:                                   # unhashable input can't be a square either
+        return None
+
+
+def _square_number(square):
+    """Returns a square number given as any integer type, such as a NumPy integer, as an int, or None."""
+    if isinstance(square, bool):                        # True and False are ints, but not squares
+        return None
+    try:
+        return operator.index(square)
+    except TypeError:
+        return None
+
+
+def _spread_bits(bits):
+    """Returns the 81-bit board with bit i moved to bit 2 * i, leaving a gap after every square."""
+    spread = 0
+    shift = 0
+    while bits:
+        spread |= SPREAD_BYTE[bits & 0xFF] << shift
+        bits >>= 8
+        shift += 16
+    return spread
+
+
+def _build_zobrist_keys(seed=0x4A53):
+    """Returns fixed pseudo-random 64-bit keys for each black square, each red square and red to move."""
+    rng = random.Random(seed)                       # fixed seed so every process hashes positions the same way
+    black_keys = tuple(rng.getrandbits(64) for _ in range(81))
+    red_keys = tuple(rng.getrandbits(64) for _ in range(81))
+    return black_keys, red_keys, rng.getrandbits(64)
+
+
+ZOBRIST_BLACK, ZOBRIST_RED, ZOBRIST_RED_TO_MOVE = _build_zobrist_keys()
+
+
+def _zobrist_hash(black_bits, red_bits, turn):
+    """Returns the Zobrist hash of a position computed from scratch."""
+    key = ZOBRIST_RED_TO_MOVE if turn == "RED" else 0
+    while black_bits:                                   # only the occupied squares contribute
+        key ^= ZOBRIST_BLACK[(black_bits & -black_bits).bit_length() - 1]
+        black_bits &= black_bits - 1
+    while red_bits:
+        key ^= ZOBRIST_RED[(red_bits & -red_bits).bit_length() - 1]
+        red_bits &= red_bits - 1
+    return key
+
+
+def _line_occupancy(bits, line):
+    """Returns the 9-bit occupancy of a rank (lines 0-8) or file (lines 9-17), indexed by position along the line."""
+    if line < 9:
+        return (bits >> (9 * line)) & 0x1FF
+    return ((bits >> (line - 9)) & FILE_MASKS[0]) * FILE_GATHER >> 72 & 0x1FF
+
+
+def _adjacent_squares(bits):
+    """Returns the mask of the squares next to (above, below, left or right of) any square in bits."""
+    return ((bits >> 9) | (bits << 9) & BOARD_MASK | (bits & ~FILE_MASKS[0]) >> 1 |
+            (bits & ~FILE_MASKS[8]) << 1 & BOARD_MASK)
+
+
+def _slide_starts(finish, own, occupied):
+    """Returns the squares of the pieces in own that can slide to the empty square finish in one move."""
+    starts = []
+    for direction in (UP, DOWN, LEFT, RIGHT):
+        nearest = _nearest_bit(direction, RAY_MASKS[direction][finish] & occupied)
+        if nearest & own:
+            starts.append(nearest.bit_length() - 1)
+    return starts
+
+
+def _ray_capture(direction, finish, own, opponent):
+    """Returns the mask of opponent pieces captured in one direction by a piece that has just landed on finish."""
+    ray = RAY_MASKS[direction][finish]
+    blockers = ray & ~opponent                          # first non-opponent square ends the run of opponent pieces
+    if not blockers:
+        if CORNER_PARTNERS[direction][finish] & own:    # lone opponent piece in a corner, flanked on its other side
+            return ray
+        return 0
+    nearest = _nearest_bit(direction, blockers)
+    if direction == UP or direction == LEFT:
+        captured = ray & -(nearest << 1)                # squares of the ray lying before the blocker
+    else:
+        captured = ray & (nearest - 1)
+    if nearest & own:
+        return captured
+    return 0
+
+
+class TextRenderer:
+    """Prints the board to the terminal every time the game is rendered."""
+
+    def render(self, game):
+        """Prints the current board of the game."""
+        print(game.get_board_text())
+
+    def message(self, text):
+        """Prints a message for the player."""
+        print(text)
+
+
+class BufferedRenderer:
+    """Remembers the last rendered game and only builds the board text when it is requested."""
+
+    def __init__(self):
+        """Initialize all private data members."""
+        self._game = None
+        self._message = None
+
+    def render(self, game):
+        """Records the game to be drawn, discarding the message left by the previous render."""
+        self._game = game
+        self._message = None
+
+    def message(self, text):
+        """Records a message to be shown below the board."""
+        self._message = text
+
+    def getvalue(self):
+        """Returns the text of the last rendered board followed by the last message, if any."""
+        if self._game is None:
+            return ""
+        text = self._game.get_board_text()
+        if self._message is not None:
+            text += "\n" + self._message
+        return text
+
 
 class HasamiShogiGame:
     """Represents the Hasami Shogi board game."""
 
-    def __init__(self):
-        """Initialize all private data members."""
+    __slots__ = ("_turn", "_state", "_red_captured", "_black_captured", "_board", "_black_bits", "_red_bits",
+                 "_black_line_moves", "_red_line_moves", "_stale_lines", "_undo_stack", "_hash", "_renderer",
+                 "_black_landing", "_red_landing", "_black_capture_squares", "_red_capture_squares",
+                 "_stale_threat_lines")
+
+    def __init__(self, renderer=None):
+        """Initialize all private data members. The board is only drawn when a renderer is given."""
         self._turn = "BLACK"
         self._state = "UNFINISHED"
         self._red_captured = 0
         self._black_captured = 0
-        self._letter = {"A": 0, "B": 1, "C": 2, "D": 3, "E": 4, "F": 5, "G": 6, "H": 7, "I": 8}
-        self._number = {"1": 0, "2": 1, "3": 2, "4": 3, "5": 4, "6": 5, "7": 6, "8": 7, "9": 8}
-        self._start_row = 0
-        self._start_column = 0
-        self._finish_row = 0
-        self._finish_column = 0
-        self._start_piece = ""
-        self._finish_piece = ""
-        self._board = []
+        self._board = None
+        self._black_bits = 0
+        self._red_bits = 0
+        self._black_line_moves = None                   # cached moves along each rank and file, made on first use
+        self._red_line_moves = None
+        self._stale_lines = (1 << 18) - 1               # bit per line whose cached moves no longer match the board
+        self._black_landing = None                      # threat map, made on first use, see _refresh_threat_map
+        self._red_landing = None
+        self._black_capture_squares = 0
+        self._red_capture_squares = 0
+        self._stale_threat_lines = 0                    # bit per line the threat map hasn't caught up with yet
+        self._undo_stack = []
+        self._hash = 0
+        self._renderer = renderer
         self._create_board()
 
     def _create_board(self):
-        """Fills board with 9 lists, each containing 9 spaces that correspond to a square on the board."""
-        for row in range(0, 9):
-            board_row = []
-            for column in range(0, 9):
-                if row == 0:
-                    board_row.append("と")               # creates red row (と represents promoted pawns)
-                elif row == 8:
-                    board_row.append("歩")               # creates black row (歩 represents unpromoted pawns)
-                else:
-                    board_row.append("・")               # creates empty spaces that align with length of characters
-            self._board.append(board_row)
+        """Fills the board with a byte per square: red on the top row, black on the bottom row, the rest empty."""
+        self._board = bytearray(STARTING_CELLS)         # red と represents promoted pawns, black 歩 unpromoted pawns
+        self._red_bits = RANK_MASKS[0]                  # bitboards mirror the rows of the byte board
+        self._black_bits = RANK_MASKS[8]
+        self._hash = _zobrist_hash(self._black_bits, self._red_bits, self._turn)
         return self._display_board()
 
     def _display_board(self):
-        """Creates a printed visual of the board."""
+        """Hands the board to the renderer, if the game has one."""
+        if self._renderer is not None:
+            self._renderer.render(self)
+
+    def get_board_text(self):
+        """Returns a visual of the board as text."""
         row_label = ["A", "B", "C", "D", "E", "F", "G", "H", "I"]
         column_label = ["1", "2", "3", "4", "5", "6", "7", "8", "9"]
-        row_counter = 0
-        print("  " + "  ".join(column_label))                       # displays column headers, followed by top of board
-        print("  " + "_" * 25)
-        for row in range(len(self._board)):
-            print(row_label[row_counter] + " " + "|", end="")       # displays row headers, continues line for values
-            print("|".join(self._board[row]) + "|")
-            row_counter += 1
-        print("  " + "¯" * 25)
+        lines = ["  " + "  ".join(column_label), "  " + "_" * 25]   # column headers, followed by top of board
+        board = bytes(self._board)
+        for row in range(9):
+            cells = board[9 * row:9 * row + 9]
+            row_text = ROW_TEXT.get(cells)
+            if row_text is None:
+                row_text = ROW_TEXT[cells] = "|" + "|".join(CELL_TEXT[cell] for cell in cells) + "|"
+            lines.append(row_label[row] + " " + row_text)     # row header, then values
+        lines.append("  " + "¯" * 25)
+        return "\n".join(lines)
 
     def make_move(self, start, finish):
         """Takes a start and finish square and moves the piece if move is valid."""
-        self._start_row = self._letter[start[0].upper()]    # indices used to identify starting piece on board
-        self._start_column = self._number[start[1]]
-        self._finish_row = self._letter[finish[0].upper()]  # indices used to identify final destination on board
-        self._finish_column = self._number[finish[1]]
-        if HasamiShogiGame._validate_move(self) is True:
-            self._board[self._start_row][self._start_column] = "・"
-            if self._turn == "BLACK":
-                self._board[self._finish_row][self._finish_column] = "歩"
-                self._finish_piece = "歩"
-            elif self._turn == "RED":
-                self._board[self._finish_row][self._finish_column] = "と"
-                self._finish_piece = "と"
-            HasamiShogiGame._check_capture(self)
+        return HasamiShogiGame.make_move_idx(self, parse_square(start), parse_square(finish))
+
+    def make_move_idx(self, start, finish):
+        """Takes start and finish square numbers (9 * row + column, 0-80) and moves the piece if move is valid."""
+        if start.__class__ is not int or finish.__class__ is not int:   # NumPy integers and the like, taken as ints
+            start, finish = _square_number(start), _square_number(finish)
+        if HasamiShogiGame._validate_move(self, start, finish) is True:
+            HasamiShogiGame._move_piece(self, start, finish)
+            self._undo_stack.clear()                    # pop_move can only take back moves made after this one
         else:
             self._display_board()
-            print("Invalid move. Please enter start and finish position again.")
+            if self._renderer is not None:
+                self._renderer.message("Invalid move. Please enter start and finish position again.")
             return False
         self._display_board()
         return True
 
-    def _validate_move(self):
+    def push_move(self, start, finish):
+        """Makes a move like make_move without rendering it, recording what pop_move needs to take it back."""
+        start, finish = parse_square(start), parse_square(finish)
+        if HasamiShogiGame._validate_move(self, start, finish) is not True:
+            return False
+        HasamiShogiGame._push_square_move(self, start, finish)
+        return True
+
+    def _push_square_move(self, start, finish):
+        """Pushes a move given as square numbers that is already known to be legal, such as one from legal moves."""
+        turn, state, red_captured, black_captured = self._turn, self._state, self._red_captured, self._black_captured
+        opponent, key = self._red_bits if turn == "BLACK" else self._black_bits, self._hash
+        HasamiShogiGame._move_piece(self, start, finish)
+        captured = opponent & ~(self._red_bits if turn == "BLACK" else self._black_bits)
+        self._undo_stack.append((start, finish, captured, red_captured, black_captured, state, turn, key))
+        return
+
+    def pop_move(self):
+        """Takes back the last move made with push_move since any make_move. Returns False if there is none."""
+        if not self._undo_stack:
+            return False
+        start, finish, captured, self._red_captured, self._black_captured, self._state, self._turn, self._hash = \
+            self._undo_stack.pop()
+        move_bits = SQUARE_BITS[start] | SQUARE_BITS[finish]
+        self._board[start] = self._board[finish]
+        self._board[finish] = EMPTY_CELL
+        if self._turn == "BLACK":
+            self._black_bits ^= move_bits
+            self._red_bits |= captured
+            opponent_piece = RED_CELL
+        else:
+            self._red_bits ^= move_bits
+            self._black_bits |= captured
+            opponent_piece = BLACK_CELL
+        self._stale_lines |= SQUARE_LINES[start] | SQUARE_LINES[finish]
+        while captured:                                 # put the captured pieces back on the printed board
+            square = (captured & -captured).bit_length() - 1
+            self._board[square] = opponent_piece
+            self._stale_lines |= SQUARE_LINES[square]
+            captured &= captured - 1
+        return True
+
+    def _move_piece(self, start, finish):
+        """Moves the piece of a validated move, then removes any captured pieces and passes the turn."""
+        move_bits = SQUARE_BITS[start] | SQUARE_BITS[finish]
+        self._board[start] = EMPTY_CELL
+        if self._turn == "BLACK":
+            self._black_bits ^= move_bits
+            self._board[finish] = BLACK_CELL
+            self._hash ^= ZOBRIST_BLACK[start] ^ ZOBRIST_BLACK[finish]
+        elif self._turn == "RED":
+            self._red_bits ^= move_bits
+            self._board[finish] = RED_CELL
+            self._hash ^= ZOBRIST_RED[start] ^ ZOBRIST_RED[finish]
+        self._stale_lines |= SQUARE_LINES[start] | SQUARE_LINES[finish]
+        HasamiShogiGame._check_capture(self, start, finish)
+        return
+
+    def _validate_move(self, start, finish):
         """Checks each point of validity and returns True or False based on the tests."""
-        self._start_piece = self._board[self._start_row][self._start_column]
-        self._finish_piece = self._board[self._finish_row][self._finish_column]
-        if HasamiShogiGame._validate_start_finish(self) is True:
+        if start.__class__ is not int or finish.__class__ is not int or not 0 <= start <= 80 or not 0 <= finish <= 80:
+            return False                                                # ensure both squares are on the board
+        if HasamiShogiGame._validate_start_finish(self, start, finish) is True:
             pass
         else:
             return False
@@ -97,21 +424,23 @@ class HasamiShogiGame:
             pass
         else:
             return False
-        if HasamiShogiGame._validate_continuity(self) is True:
+        if HasamiShogiGame._validate_continuity(self, start, finish) is True:
             pass
         else:
             return False
         return True
 
-    def _validate_start_finish(self):
+    def _validate_start_finish(self, start, finish):
         """Ensures start piece matches turn, finish piece is empty, and doesn't move diagonally."""
-        if self._turn == "BLACK" and self._start_piece == "歩" and self._finish_piece == "・":
-            pass
-        elif self._turn == "RED" and self._start_piece == "と" and self._finish_piece == "・":
-            pass                                                                    # ensure correct start piece and
-        else:                                                                       # turn, empty destination square
+        if self._turn == "BLACK":
+            own = self._black_bits
+        else:
+            own = self._red_bits
+        if not own & SQUARE_BITS[start]:                                    # ensure correct start piece and turn
             return False
-        if self._start_row == self._finish_row or self._start_column == self._finish_column:    # ensure no diagonals
+        if (self._black_bits | self._red_bits) & SQUARE_BITS[finish]:      # ensure empty destination
+            return False
+        if start // 9 == finish // 9 or start % 9 == finish % 9:            # ensure no diagonals
             pass
         else:
             return False
@@ -125,272 +454,179 @@ class HasamiShogiGame:
             return False
         return True
 
-    def _validate_continuity(self):
+    def _validate_continuity(self, start, finish):
         """Checks which direction the piece moves and returns True or False depending on test results."""
-        if self._start_row > self._finish_row:                                          # move up
-            if HasamiShogiGame._validate_up(self) is True:
-                pass
-            else:
-                return False
-        if self._start_row < self._finish_row:                                          # move down
-            if HasamiShogiGame._validate_down(self) is True:
-                pass
-            else:
-                return False
-        if self._start_column > self._finish_column:                                    # move left
-            if HasamiShogiGame._validate_left(self) is True:
-                pass
-            else:
-                return False
-        if self._start_column < self._finish_column:                                    # move right
-            if HasamiShogiGame._validate_right(self) is True:
-                pass
-            else:
-                return False
+        if start // 9 > finish // 9:                                    # move up
+            return HasamiShogiGame._validate_up(self, start, finish)
+        if start // 9 < finish // 9:                                    # move down
+            return HasamiShogiGame._validate_down(self, start, finish)
+        if start > finish:                                              # move left
+            return HasamiShogiGame._validate_left(self, start, finish)
+        if start < finish:                                              # move right
+            return HasamiShogiGame._validate_right(self, start, finish)
         return True
 
-    def _validate_up(self):
-        """Checks each square between start and finish when moving up to ensure no jumps occur."""
-        check_spaces = abs(self._start_row - self._finish_row)
-        for num in range(1, check_spaces):
-            square = self._board[self._start_row - num][self._start_column]
-            if square != "・":
-                return False
-        return True
+    def _validate_up(self, start, finish):
+        """Checks the file mask between start and finish when moving up to ensure no jumps occur."""
+        path = RAY_MASKS[UP][start] ^ RAY_MASKS[UP][finish] ^ SQUARE_BITS[finish]
+        return not path & (self._black_bits | self._red_bits)
 
-    def _validate_down(self):
-        """Checks each square between start and finish when moving down to ensure no jumps occur."""
-        check_spaces = abs(self._start_row - self._finish_row)
-        for num in range(1, check_spaces):
-            square = self._board[self._start_row + num][self._start_column]
-            if square != "・":
-                return False
-        return True
+    def _validate_down(self, start, finish):
+        """Checks the file mask between start and finish when moving down to ensure no jumps occur."""
+        path = RAY_MASKS[DOWN][start] ^ RAY_MASKS[DOWN][finish] ^ SQUARE_BITS[finish]
+        return not path & (self._black_bits | self._red_bits)
 
-    def _validate_left(self):
-        """Checks each square between start and finish when moving left to ensure no jumps occur."""
-        check_spaces = abs(self._start_column - self._finish_column)
-        for num in range(1, check_spaces):
-            square = self._board[self._start_row][self._start_column - num]
-            if square != "・":
-                return False
-        return True
+    def _validate_left(self, start, finish):
+        """Checks the rank mask between start and finish when moving left to ensure no jumps occur."""
+        path = RAY_MASKS[LEFT][start] ^ RAY_MASKS[LEFT][finish] ^ SQUARE_BITS[finish]
+        return not path & (self._black_bits | self._red_bits)
 
-    def _validate_right(self):
-        """Checks each square between start and finish when moving right to ensure no jumps occur."""
-        check_spaces = abs(self._start_column - self._finish_column)
-        for num in range(1, check_spaces):
-            square = self._board[self._start_row][self._start_column + num]
-            if square != "・":
-                return False
-        return True
+    def _validate_right(self, start, finish):
+        """Checks the rank mask between start and finish when moving right to ensure no jumps occur."""
+        path = RAY_MASKS[RIGHT][start] ^ RAY_MASKS[RIGHT][finish] ^ SQUARE_BITS[finish]
+        return not path & (self._black_bits | self._red_bits)
 
-    def _check_capture(self):
+    def _check_capture(self, start, finish):
         """Checks for direction of movement and determines if pieces can be potentially captured."""
-        if self._start_row > self._finish_row:                          # started down, can't capture down
-            HasamiShogiGame._potential_up(self)
-        elif self._start_row < self._finish_row:                          # started up, can't capture up
-            HasamiShogiGame._potential_down(self)
-        elif self._start_column > self._finish_column:                    # started right, can't capture right
-            HasamiShogiGame._potential_left(self)
-        elif self._start_column < self._finish_column:                    # started left, can't capture left
-            HasamiShogiGame._potential_right(self)
+        if self._turn == "BLACK":
+            own, opponent = self._black_bits, self._red_bits
+        else:
+            own, opponent = self._red_bits, self._black_bits
+        if not opponent & ADJACENT_MASKS[finish]:                       # nothing to capture next to finish square
+            pass
+        elif start // 9 > finish // 9:                                  # started down, can't capture down
+            HasamiShogiGame._potential_up(self, finish, own, opponent)
+        elif start // 9 < finish // 9:                                  # started up, can't capture up
+            HasamiShogiGame._potential_down(self, finish, own, opponent)
+        elif start > finish:                                            # started right, can't capture right
+            HasamiShogiGame._potential_left(self, finish, own, opponent)
+        elif start < finish:                                            # started left, can't capture left
+            HasamiShogiGame._potential_right(self, finish, own, opponent)
         HasamiShogiGame._check_for_win(self)
         return
 
-    def _potential_up(self):
+    def _potential_up(self, finish, own, opponent):
         """Check for potential captures up, left, and right from the finish square."""
-        if self._finish_row > 0:
-            HasamiShogiGame._up_check(self)
-        if self._finish_column > 0:
-            HasamiShogiGame._left_check(self)
-        if self._finish_column < 8:
-            HasamiShogiGame._right_check(self)
+        if opponent & NEIGHBOR_BITS[UP][finish]:        # a capture needs an opponent piece next to the finish square
+            HasamiShogiGame._up_check(self, finish, own, opponent)
+        if opponent & NEIGHBOR_BITS[LEFT][finish]:
+            HasamiShogiGame._left_check(self, finish, own, opponent)
+        if opponent & NEIGHBOR_BITS[RIGHT][finish]:
+            HasamiShogiGame._right_check(self, finish, own, opponent)
         return
 
-    def _potential_down(self):
+    def _potential_down(self, finish, own, opponent):
         """Check for potential captures down, left, and right from the finish square."""
-        if self._finish_row < 8:
-            HasamiShogiGame._down_check(self)
-        if self._finish_column > 0:
-            HasamiShogiGame._left_check(self)
-        if self._finish_column < 8:
-            HasamiShogiGame._right_check(self)
+        if opponent & NEIGHBOR_BITS[DOWN][finish]:
+            HasamiShogiGame._down_check(self, finish, own, opponent)
+        if opponent & NEIGHBOR_BITS[LEFT][finish]:
+            HasamiShogiGame._left_check(self, finish, own, opponent)
+        if opponent & NEIGHBOR_BITS[RIGHT][finish]:
+            HasamiShogiGame._right_check(self, finish, own, opponent)
         return
 
-    def _potential_left(self):
+    def _potential_left(self, finish, own, opponent):
         """Check for potential captures up, down, and left from the finish square."""
-        if self._finish_row > 0:
-            HasamiShogiGame._up_check(self)
-        if self._finish_row < 8:
-            HasamiShogiGame._down_check(self)
-        if self._finish_column > 0:
-            HasamiShogiGame._left_check(self)
+        if opponent & NEIGHBOR_BITS[UP][finish]:
+            HasamiShogiGame._up_check(self, finish, own, opponent)
+        if opponent & NEIGHBOR_BITS[DOWN][finish]:
+            HasamiShogiGame._down_check(self, finish, own, opponent)
+        if opponent & NEIGHBOR_BITS[LEFT][finish]:
+            HasamiShogiGame._left_check(self, finish, own, opponent)
         return
 
-    def _potential_right(self):
+    def _potential_right(self, finish, own, opponent):
         """Check for potential captures up, down, and right from the finish square."""
-        if self._finish_row > 0:
-            HasamiShogiGame._up_check(self)
-        if self._finish_row < 8:
-            HasamiShogiGame._down_check(self)
-        if self._finish_column < 8:
-            HasamiShogiGame._right_check(self)
+        if opponent & NEIGHBOR_BITS[UP][finish]:
+            HasamiShogiGame._up_check(self, finish, own, opponent)
+        if opponent & NEIGHBOR_BITS[DOWN][finish]:
+            HasamiShogiGame._down_check(self, finish, own, opponent)
+        if opponent & NEIGHBOR_BITS[RIGHT][finish]:
+            HasamiShogiGame._right_check(self, finish, own, opponent)
         return
 
-    def _up_check(self):
+    def _up_check(self, finish, own, opponent):
         """Determines whether pieces above the finish piece can be captured."""
-        row_index = []
-        index = 1
-        next_piece = self._board[self._finish_row - index][self._finish_column]
-        if next_piece == self._finish_piece or next_piece == "・":           # needs to be opposite character
-            return
-        else:
-            row_index.append(self._finish_row - index)
-        if self._finish_row - index == 0 and self._finish_column == 0:      # top left corner capture
-            if self._board[self._finish_row - index][self._finish_column + index] == self._finish_piece:
-                HasamiShogiGame._capture_up(self, row_index)
-        elif self._finish_row - index == 0 and self._finish_column == 8:    # top right corner capture
-            if self._board[self._finish_row - index][self._finish_column - index] == self._finish_piece:
-                HasamiShogiGame._capture_up(self, row_index)
-        elif self._finish_row - index == 0:                                 # no possible captures
-            return
-        index += 1
-        while self._finish_row - index >= 0:        # loop until determined whether or not capture can be made
-            if self._board[self._finish_row - index][self._finish_column] == "・":
-                return
-            elif self._board[self._finish_row - index][self._finish_column] != self._finish_piece:
-                row_index.append(self._finish_row - index)
-            else:
-                HasamiShogiGame._capture_up(self, row_index)
-                return
+        captured = _ray_capture(UP, finish, own, opponent)
+        if captured:
+            HasamiShogiGame._capture_up(self, captured)
         return
 
-    def _down_check(self):
+    def _down_check(self, finish, own, opponent):
         """Determines whether pieces below the finish piece can be captured."""
-        row_index = []
-        index = 1
-        next_piece = self._board[self._finish_row + index][self._finish_column]
-        if next_piece == self._finish_piece or next_piece == "・":           # needs to be opposite character
-            return
-        else:
-            row_index.append(self._finish_row + index)
-        if self._finish_row + index == 8 and self._finish_column == 0:      # bottom left corner
-            if self._board[self._finish_row + index][self._finish_column + index] == self._finish_piece:
-                HasamiShogiGame._capture_down(self, row_index)
-        elif self._finish_row + index == 8 and self._finish_column == 8:    # bottom right corner
-            if self._board[self._finish_row + index][self._finish_column - index] == self._finish_piece:
-                HasamiShogiGame._capture_down(self, row_index)
-        elif self._finish_row + index == 8:                                 # no possible captures
-            return
-        index += 1
-        while self._finish_row + index <= 8:        # loop until determined whether or not capture can be made
-            if self._board[self._finish_row + index][self._finish_column] == "・":
-                return
-            elif self._board[self._finish_row + index][self._finish_column] != self._finish_piece:
-                row_index.append(self._finish_row + index)
-            else:
-                HasamiShogiGame._capture_down(self, row_index)
-                return
-            index += 1
+        captured = _ray_capture(DOWN, finish, own, opponent)
+        if captured:
+            HasamiShogiGame._capture_down(self, captured)
         return
 
-    def _left_check(self):
+    def _left_check(self, finish, own, opponent):
         """Determines whether pieces left of the finish piece can be captured."""
-        column_index = []
-        index = 1
-        next_piece = self._board[self._finish_row][self._finish_column - index]
-        if next_piece == self._finish_piece or next_piece == "・":           # needs to be opposite character
-            return
-        else:
-            column_index.append(self._finish_column - index)
-        if self._finish_row == 0 and self._finish_column - index == 0:      # top left corner
-            if self._board[self._finish_row + index][self._finish_column - index] == self._finish_piece:
-                HasamiShogiGame._capture_left(self, column_index)
-        elif self._finish_row == 8 and self._finish_column - index == 0:    # bottom left corner
-            if self._board[self._finish_row - index][self._finish_column - index] == self._finish_piece:
-                HasamiShogiGame._capture_left(self, column_index)
-        elif self._finish_column - index == 0:                              # no possible captures
-            return
-        index += 1
-        while self._finish_column - index >= 0:         # loop until determined whether or not capture can be made
-            if self._board[self._finish_row][self._finish_column - index] == "・":
-                return
-            elif self._board[self._finish_row][self._finish_column - index] != self._finish_piece:
-                column_index.append(self._finish_column - index)
-            else:
-                HasamiShogiGame._capture_left(self, column_index)
-                return
-            index += 1
+        captured = _ray_capture(LEFT, finish, own, opponent)
+        if captured:
+            HasamiShogiGame._capture_left(self, captured)
         return
 
-    def _right_check(self):
+    def _right_check(self, finish, own, opponent):
         """Determines whether pieces right of the finish piece can be captured."""
-        column_index = []
-        index = 1
-        next_piece = self._board[self._finish_row][self._finish_column + index]
-        if next_piece == self._finish_piece or next_piece == "・":           # needs to be opposite character
-            return
+        captured = _ray_capture(RIGHT, finish, own, opponent)
+        if captured:
+            HasamiShogiGame._capture_right(self, captured)
+        return
+
+    def _capture_mask(self, start, finish):
+        """Returns the opponent pieces a legal move from start to finish would capture, without making the move."""
+        if self._turn == "BLACK":
+            own, opponent = self._black_bits, self._red_bits
         else:
-            column_index.append(self._finish_column + index)
-        if self._finish_row == 0 and self._finish_column + index == 8:      # top right corner
-            if self._board[self._finish_row + index][self._finish_column + index] == self._finish_piece:
-                HasamiShogiGame._capture_right(self, column_index)
-        elif self._finish_row == 8 and self._finish_column + index == 8:    # bottom right corner
-            if self._board[self._finish_row - index][self._finish_column + index] == self._finish_piece:
-                HasamiShogiGame._capture_right(self, column_index)
-        elif self._finish_column + index == 8:                              # no possible captures
-            return
-        index += 1
-        while self._finish_column + index <= 8:         # loop until determined whether or not capture can be made
-            if self._board[self._finish_row][self._finish_column + index] == "・":
-                return
-            elif self._board[self._finish_row][self._finish_column + index] != self._finish_piece:
-                column_index.append(self._finish_column + index)
-            else:
-                HasamiShogiGame._capture_right(self, column_index)
-                return
-            index += 1
+            own, opponent = self._red_bits, self._black_bits
+        if not opponent & ADJACENT_MASKS[finish]:
+            return 0
+        if start > finish:                              # the square behind the piece can't be captured
+            behind = DOWN if start - finish >= 9 else RIGHT
+        else:
+            behind = UP if finish - start >= 9 else LEFT
+        captured = 0
+        for direction in (UP, DOWN, LEFT, RIGHT):       # same scans as _up_check ... _right_check
+            if direction != behind and opponent & NEIGHBOR_BITS[direction][finish]:
+                captured |= _ray_capture(direction, finish, own, opponent)
+        return captured
+
+    def _remove_captured(self, captured):
+        """Clears the captured squares from the opponent's bitboard and adds them to the opponent's captured count."""
+        if self._turn == "BLACK":
+            self._red_bits &= ~captured
+            self._red_captured += captured.bit_count()
+            keys = ZOBRIST_RED
+        elif self._turn == "RED":
+            self._black_bits &= ~captured
+            self._black_captured += captured.bit_count()
+            keys = ZOBRIST_BLACK
+        while captured:                                 # keep the printed board and hash in step with the bitboards
+            square = (captured & -captured).bit_length() - 1
+            self._board[square] = EMPTY_CELL
+            self._hash ^= keys[square]
+            self._stale_lines |= SQUARE_LINES[square]
+            captured &= captured - 1
         return
 
-    def _capture_up(self, row_index_list):
+    def _capture_up(self, captured):
         """Captures opponent pieces between player's pieces."""
-        for index in row_index_list:
-            self._board[index][self._finish_column] = "・"
-            if self._turn == "BLACK":
-                self._red_captured += 1
-            elif self._turn == "RED":
-                self._black_captured += 1
+        HasamiShogiGame._remove_captured(self, captured)
         return
 
-    def _capture_down(self, row_index_list):
+    def _capture_down(self, captured):
         """Captures opponent pieces between player's pieces."""
-        for index in row_index_list:
-            self._board[index][self._finish_column] = "・"
-            if self._turn == "BLACK":
-                self._red_captured += 1
-            elif self._turn == "RED":
-                self._black_captured += 1
+        HasamiShogiGame._remove_captured(self, captured)
         return
 
-    def _capture_left(self, column_index_list):
+    def _capture_left(self, captured):
         """Captures opponent pieces between player's pieces."""
-        for index in column_index_list:
-            self._board[self._finish_row][index] = "・"
-            if self._turn == "BLACK":
-                self._red_captured += 1
-            elif self._turn == "RED":
-                self._black_captured += 1
+        HasamiShogiGame._remove_captured(self, captured)
         return
 
-    def _capture_right(self, column_index_list):
+    def _capture_right(self, captured):
         """Captures opponent pieces between player's pieces."""
-        for index in column_index_list:
-            self._board[self._finish_row][index] = "・"
-            if self._turn == "BLACK":
-                self._red_captured += 1
-            elif self._turn == "RED":
-                self._black_captured += 1
+        HasamiShogiGame._remove_captured(self, captured)
         return
 
     def _check_for_win(self):
@@ -417,8 +653,175 @@ class HasamiShogiGame:
             self._turn = "RED"
         elif self._turn == "RED":
             self._turn = "BLACK"
+        self._hash ^= ZOBRIST_RED_TO_MOVE
+        return
+
+    def _clear_stale_lines(self):
+        """Drops the cached moves of every line changed by a move or capture since the last move generation."""
+        stale_lines = self._stale_lines
+        self._stale_threat_lines |= stale_lines         # the threat map catches up with these lines when next asked
+        if self._black_line_moves is None:              # nothing cached yet, start with every line stale
+            self._black_line_moves, self._red_line_moves = [None] * 18, [None] * 18
+            stale_lines = 0
+        while stale_lines:
+            line = (stale_lines & -stale_lines).bit_length() - 1
+            self._black_line_moves[line] = self._red_line_moves[line] = None
+            stale_lines &= stale_lines - 1
+        self._stale_lines = 0
+        return
+
+    def _line_moves(self, line):
+        """Returns the moves of the player whose turn it is along one rank or file, regenerating them if stale."""
+        if self._turn == "BLACK":
+            line_moves, own = self._black_line_moves, self._black_bits
+        else:
+            line_moves, own = self._red_line_moves, self._red_bits
+        moves = line_moves[line]
+        if moves is None:
+            occupancy = _line_occupancy(self._black_bits | self._red_bits, line)
+            own_positions = _line_occupancy(own, line)
+            squares = LINE_SQUARES[line]
+            moves = []
+            while own_positions:
+                position = (own_positions & -own_positions).bit_length() - 1
+                start = squares[position]
+                for target in SLIDE_TARGETS[position][occupancy]:
+                    moves.append(SQUARE_PAIRS[start][squares[target]])
+                own_positions &= own_positions - 1
+            moves = line_moves[line] = tuple(moves)
+        return moves
+
+    def _legal_square_moves(self):
+        """Returns the legal moves of the player whose turn it is as pairs of square numbers."""
+        if self._state != "UNFINISHED":
+            return []
+        if self._stale_lines:
+            HasamiShogiGame._clear_stale_lines(self)
+        moves = []
+        for line in range(18):
+            moves.extend(HasamiShogiGame._line_moves(self, line))
+        return moves
+
+    def iter_legal_moves(self):
+        """Yields the legal moves of the player whose turn it is as (start, finish) pairs, one line at a time."""
+        if self._state != "UNFINISHED":
+            return
+        if self._stale_lines:
+            HasamiShogiGame._clear_stale_lines(self)
+        for line in range(18):
+            for start, finish in HasamiShogiGame._line_moves(self, line):
+                yield SQUARE_NAMES[start], SQUARE_NAMES[finish]
+
+    def legal_moves(self):
+        """Returns a list of every legal move of the player whose turn it is as (start, finish) pairs."""
+        return [(SQUARE_NAMES[start], SQUARE_NAMES[finish])
+                for start, finish in HasamiShogiGame._legal_square_moves(self)]
+
+    def _refresh_threat_map(self):
+        """Recomputes the capture masks of the squares along every line changed since the threat map was last used."""
+        if self._stale_lines:
+            HasamiShogiGame._clear_stale_lines(self)
+        stale_lines = self._stale_threat_lines
+        if self._black_landing is None:                 # first use, fill in every square
+            self._black_landing, self._red_landing = [0] * 81, [0] * 81
+            stale_lines = (1 << 18) - 1
+        if not stale_lines:
+            return
+        self._stale_threat_lines = 0
+        black, red = self._black_bits, self._red_bits
+        black_landing, red_landing = self._black_landing, self._red_landing
+        dirty = CORNER_NEIGHBORS                        # their corner captures depend on squares off their lines
+        while stale_lines:
+            line = (stale_lines & -stale_lines).bit_length() - 1
+            dirty |= LINE_MASKS[line]
+            stale_lines &= stale_lines - 1
+        cleared = dirty & (self._black_capture_squares | self._red_capture_squares)
+        while cleared:                                  # forget the old captures of every changed square
+            square = (cleared & -cleared).bit_length() - 1
+            black_landing[square] = red_landing[square] = 0
+            cleared &= cleared - 1
+        black_squares = self._black_capture_squares & ~dirty
+        red_squares = self._red_capture_squares & ~dirty
+        dirty &= ~(black | red)                         # pieces can only land on empty squares
+        todo = dirty & _adjacent_squares(red)           # same ray scans as _check_capture, where black could capture
+        while todo:
+            square_bit = todo & -todo
+            square = square_bit.bit_length() - 1
+            captured = 0
+            for direction in (UP, DOWN, LEFT, RIGHT):
+                if red & NEIGHBOR_BITS[direction][square]:
+                    captured |= _ray_capture(direction, square, black, red)
+            if captured:
+                black_landing[square] = captured
+                black_squares |= square_bit
+            todo ^= square_bit
+        todo = dirty & _adjacent_squares(black)         # and where red could capture
+        while todo:
+            square_bit = todo & -todo
+            square = square_bit.bit_length() - 1
+            captured = 0
+            for direction in (UP, DOWN, LEFT, RIGHT):
+                if black & NEIGHBOR_BITS[direction][square]:
+                    captured |= _ray_capture(direction, square, red, black)
+            if captured:
+                red_landing[square] = captured
+                red_squares |= square_bit
+            todo ^= square_bit
+        self._black_capture_squares, self._red_capture_squares = black_squares, red_squares
         return
 
+    def _capture_landing(self):
+        """Returns the list of the opponent pieces the active player captures by landing on each empty square."""
+        HasamiShogiGame._refresh_threat_map(self)
+        return self._black_landing if self._turn == "BLACK" else self._red_landing
+
+    def capturing_moves(self):
+        """Returns the legal moves that capture as (start, finish, number captured), the largest captures first."""
+        if self._state != "UNFINISHED":
+            return []
+        HasamiShogiGame._refresh_threat_map(self)
+        if self._turn == "BLACK":
+            own, landing, targets = self._black_bits, self._black_landing, self._black_capture_squares
+        else:
+            own, landing, targets = self._red_bits, self._red_landing, self._red_capture_squares
+        occupied = self._black_bits | self._red_bits
+        moves = []
+        while targets:
+            finish = (targets & -targets).bit_length() - 1
+            num_captured = landing[finish].bit_count()
+            for start in _slide_starts(finish, own, occupied):
+                moves.append((SQUARE_NAMES[start], SQUARE_NAMES[finish], num_captured))
+            targets &= targets - 1
+        moves.sort(key=lambda move: -move[2])
+        return moves
+
+    def capture_count(self, start, finish):
+        """Returns the number of pieces a move would capture, or None if the move isn't legal."""
+        start, finish = parse_square(start), parse_square(finish)
+        if HasamiShogiGame._validate_move(self, start, finish) is not True:
+            return None
+        return HasamiShogiGame._capture_landing(self)[finish].bit_count()
+
+    def threatened_squares(self, color):
+        """Returns the squares of the pieces of a color that the other color could capture with its next move."""
+        if str(color).lower() not in ("black", "red"):
+            return None
+        if self._state != "UNFINISHED":
+            return []
+        HasamiShogiGame._refresh_threat_map(self)
+        if str(color).lower() == "black":              # threats come from the landing squares of the other color
+            own, landing, targets = self._red_bits, self._red_landing, self._red_capture_squares
+        else:
+            own, landing, targets = self._black_bits, self._black_landing, self._black_capture_squares
+        occupied = self._black_bits | self._red_bits
+        threatened = 0
+        while targets:
+            finish = (targets & -targets).bit_length() - 1
+            if _slide_starts(finish, own, occupied):
+                threatened |= landing[finish]
+            targets &= targets - 1
+        return [SQUARE_NAMES[square] for square in range(81) if threatened >> square & 1]
+
     def get_game_state(self):
         """Returns whether the game is unfinished or which side has won."""
         return self._state
@@ -427,6 +830,51 @@ class HasamiShogiGame:
         """Returns whose turn it is."""
         return self._turn
 
+    def to_bytes(self):
+        """Returns the position as 24 bytes: 2 bits per square, then the turn and state, then the captured counts."""
+        squares = _spread_bits(self._black_bits) | _spread_bits(self._red_bits) << 1     # 0 empty, 1 black, 2 red
+        flags = (1 if self._turn == "RED" else 0) | STATE_CODES[self._state] << 1
+        return squares.to_bytes(21, "little") + bytes((flags, self._red_captured, self._black_captured))
+
+    @classmethod
+    def from_bytes(cls, data, renderer=None):
+        """Returns a new game set up in the position encoded by to_bytes. Raises ValueError for anything else."""
+        if len(data) != POSITION_BYTES:
+            raise ValueError("a position is %d bytes, not %d" % (POSITION_BYTES, len(data)))
+        cells = b"".join([UNPACKED_BYTE[byte] for byte in data[:21]])
+        flags = data[21]
+        if 3 in cells or any(cells[81:]) or flags >> 1 & 3 == 3 or flags >> 3:    # codes to_bytes never writes
+            raise ValueError("not a position written by to_bytes")
+        game = cls.__new__(cls)                         # every slot is set here, without setting up a starting board
+        game._turn = "RED" if flags & 1 else "BLACK"
+        game._state = STATE_NAMES[flags >> 1]
+        game._red_captured, game._black_captured = data[22], data[23]
+        game._board = bytearray(cells[:81])
+        game._black_bits = int(cells[80::-1].translate(BLACK_DIGITS), 2)    # square 80 is the most significant bit
+        game._red_bits = int(cells[80::-1].translate(RED_DIGITS), 2)
+        game._black_line_moves = game._red_line_moves = None
+        game._stale_lines = (1 << 18) - 1
+        game._black_landing = game._red_landing = None
+        game._black_capture_squares = game._red_capture_squares = 0
+        game._stale_threat_lines = 0
+        game._undo_stack = []
+        game._hash = _zobrist_hash(game._black_bits, game._red_bits, game._turn)
+        game._renderer = renderer
+        return game
+
+    def freeze(self):
+        """Returns an immutable snapshot of the position to keep in place of an idle game, see to_bytes."""
+        return HasamiShogiGame.to_bytes(self)
+
+    @classmethod
+    def thaw(cls, snapshot, renderer=None):
+        """Returns a live game in the position of a snapshot made by freeze. Moves made before freezing can't be popped."""
+        return cls.from_bytes(snapshot, renderer)
+
+    def get_zobrist_hash(self):
+        """Returns the 64-bit Zobrist hash of the pieces on the board and the player to move."""
+        return self._hash
+
     def get_num_captured_pieces(self, color):
         """Returns the number of pieces captured by a given color."""
         if str(color).lower() == "black":
@@ -438,13 +886,13 @@ class HasamiShogiGame:
 
     def get_square_occupant(self, square):
         """Takes square reference and returns either NONE or the color on it."""
-        square_row = square[0].upper()
-        square_column = square[1]
-        row_value = self._letter[square_row]
-        column_value = self._number[square_column]
-        if self._board[row_value][column_value] == "歩":
+        square = parse_square(square)
+        if square is None:
+            return None
+        square_bit = SQUARE_BITS[square]
+        if self._black_bits & square_bit:
             return "BLACK"
-        elif self._board[row_value][column_value] == "と":
+        elif self._red_bits & square_bit:
             return "RED"
         else:
             return "NONE"
@@ -455,7 +903,7 @@ class HasamiShogiGame:
 # 1 = 0, 2 = 1, 3 = 2, 4 = 3, 5 = 4, 6 = 5, 7 = 6, 8 = 7, 9 = 8
 
 if __name__ == "__main__":
-    game = HasamiShogiGame()
+    game = HasamiShogiGame(TextRenderer())
     print('The player with the "歩" pieces starts the game.')
     while game.get_game_state() == "UNFINISHED":
         print("Enter the position of the piece you wish to move.")
@@ -0,0 +1,239 @@
+# Description: An MCTSPlayer class is created to choose moves for the player whose turn it is in a HasamiShogiGame by
+#              Monte Carlo tree search with the UCT rule. Each iteration walks down the tree from the current position,
+#              always taking the child with the best upper confidence bound, adds one new child and scores it with a
+#              rollout: random legal moves played on a headless copy of the position straight through the move
+#              generator, without validation or rendering, until the game is won or the rollout length runs out, when
+#              the side that has captured more pieces is scored ahead. The tree is kept between moves: when search is
+#              called again, the node for the new position is looked up among the grandchildren of the old root and the
+#              statistics below it are reused. With more than one worker, leaves are chosen a batch at a time (each
+#              chosen leaf counts as a visit at once, so the rest of the batch spreads out) and their rollouts are run on
+#              a pool of worker processes. Searches stop after a number of iterations, a time budget in milliseconds,
+#              or whichever comes first, and report the rollouts per second they reached. When an OpeningBook or a
+#              Tablebase is given, the position is looked up there first and a move found there is played at once.
+
+import concurrent.futures
+import math
+import random
+import time
+
+from HasamiShogiGame import HasamiShogiGame, SQUARE_NAMES
+
+ROLLOUTS_PER_TASK = 8                                   # rollouts sent to a worker in one task, to cover the overhead
+
+
+class _Node:
+    """Represents a position in the search tree, reached by a move of the given player."""
+
+    __slots__ = ("move", "parent", "mover", "key", "children", "untried", "visits", "wins")
+
+    def __init__(self, move, parent, mover, key):
+        """Initialize all data members. Moves are only listed when the node is first expanded."""
+        self.move = move
+        self.parent = parent
+        self.mover = mover
+        self.key = key
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0                                 # score of the mover summed over every visit
+
+
+def _rollout_score(snapshot, rng, max_moves):
+    """Plays random moves from a frozen position and returns its score for black: 1 won, 0 lost, else by captures."""
+    game = HasamiShogiGame.thaw(snapshot)
+    for _ in range(max_moves):
+        if game._state != "UNFINISHED":
+            break
+        moves = game._legal_square_moves()
+        if not moves:
+            break
+        start, finish = moves[rng.randrange(len(moves))]
+        game._move_piece(start, finish)                 # legal by construction, no validation or undo record needed
+    if game._state == "BLACK_WON":
+        return 1.0
+    if game._state == "RED_WON":
+        return 0.0
+    return 0.5 + (game._red_captured - game._black_captured) / 16
+
+
+def _rollout_batch(snapshots, seed, max_moves):
+    """Returns the black scores of rollouts from each of a list of frozen positions, run in a worker."""
+    rng = random.Random(seed)
+    return [_rollout_score(snapshot, rng, max_moves) for snapshot in snapshots]
+
+
+class MCTSPlayer:
+    """Represents a Monte Carlo tree search player for Hasami Shogi."""
+
+    def __init__(self, iterations=1000, time_limit_ms=None, exploration=1.4, workers=1, max_rollout_moves=200,
+                 seed=None, book=None, tablebase=None):
+        """Initialize all private data members. Either budget may be None, but not both."""
+        if iterations is None and time_limit_ms is None:
+            raise ValueError("an iteration or time budget is needed")
+        self._iterations = iterations
+        self._time_limit_ms = time_limit_ms
+        self._exploration = exploration
+        self._workers = workers
+        self._max_rollout_moves = max_rollout_moves
+        self._rng = random.Random(seed)
+        self._book = book                               # OpeningBook and Tablebase, looked up before searching
+        self._tablebase = tablebase
+        self._source = "search"
+        self._pool = None
+        self._root = None
+        self._reused_visits = 0
+        self._num_iterations = 0
+        self._num_rollouts = 0
+        self._elapsed = 0.0
+
+    def search(self, game):
+        """Returns the most visited move for the player whose turn it is as a (start, finish) pair, or None."""
+        start_time = time.perf_counter()
+        self._num_iterations = self._num_rollouts = 0
+        for source, lookup in (("book", self._book), ("tablebase", self._tablebase)):
+            move = lookup.lookup(game) if lookup is not None else None
+            if move is not None:
+                self._source = source
+                self._elapsed = time.perf_counter() - start_time
+                return move
+        self._source = "search"
+        deadline = None if self._time_limit_ms is None else start_time + self._time_limit_ms / 1000
+        MCTSPlayer._reuse_root(self, game)
+        has_moves = bool(game._legal_square_moves())
+        while has_moves and (self._iterations is None or self._num_iterations < self._iterations):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            batch_size = 1 if self._workers == 1 else self._workers * ROLLOUTS_PER_TASK
+            if self._iterations is not None:
+                batch_size = min(batch_size, self._iterations - self._num_iterations)
+            MCTSPlayer._run_batch(self, game, batch_size)
+        self._elapsed = time.perf_counter() - start_time
+        if not self._root.children:
+            return None
+        best = max(self._root.children, key=lambda child: child.visits)
+        return SQUARE_NAMES[best.move[0]], SQUARE_NAMES[best.move[1]]
+
+    def get_stats(self):
+        """Returns the iterations, rollouts and rollouts per second, visits reused from the last search and time used."""
+        return {"source": self._source,                 # "book", "tablebase" or "search"
+                "iterations": self._num_iterations,
+                "rollouts": self._num_rollouts,
+                "rollouts_per_second": self._num_rollouts / self._elapsed if self._elapsed > 0 else 0.0,
+                "reused_visits": self._reused_visits,
+                "root_visits": self._root.visits if self._root is not None else 0,
+                "elapsed_ms": self._elapsed * 1000}
+
+    def close(self):
+        """Shuts down the worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        """Returns the player for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Shuts down the worker pool at the end of a with statement."""
+        self.close()
+
+    def __getstate__(self):
+        """Leaves the pool and the tree out when the player is sent to another process."""
+        state = dict(self.__dict__)
+        state["_pool"], state["_root"] = None, None
+        return state
+
+    def _reuse_root(self, game):
+        """Makes the node for the game's position the root, keeping its subtree, or starts a new tree."""
+        key = game.get_zobrist_hash()
+        root = None
+        if self._root is not None:
+            candidates = [self._root] + [grandchild for child in self._root.children for grandchild in child.children]
+            for node in candidates:
+                if node.key == key:
+                    root = node
+                    break
+        if root is None:
+            mover = "RED" if game.get_active_player() == "BLACK" else "BLACK"
+            root = _Node(None, None, mover, key)
+        root.parent = None
+        self._root = root
+        self._reused_visits = root.visits
+
+    def _run_batch(self, game, batch_size):
+        """Chooses a batch of leaves, scores them by rollout and backs the scores up."""
+        leaves, snapshots = [], []
+        for _ in range(batch_size):
+            leaf, snapshot, score = MCTSPlayer._select_and_expand(self, game)
+            if snapshot is None:                        # the game is over at this leaf, the score is already known
+                MCTSPlayer._backpropagate(leaf, score)
+            else:
+                leaves.append(leaf)
+                snapshots.append(snapshot)
+            self._num_iterations += 1
+        if snapshots:
+            self._num_rollouts += len(snapshots)
+            for leaf, score in zip(leaves, MCTSPlayer._rollouts(self, snapshots)):
+                MCTSPlayer._backpropagate(leaf, score)
+        return
+
+    def _select_and_expand(self, game):
+        """Walks down to a node with an untried move, adds its child and returns it with a snapshot or final score."""
+        node = self._root
+        depth = 0
+        while True:
+            if node.untried is None:
+                node.untried = game._legal_square_moves() if game._state == "UNFINISHED" else []
+                self._rng.shuffle(node.untried)
+            node.visits += 1                            # counted now so the rest of a batch spreads out
+            if node.untried or not node.children:
+                break
+            node = MCTSPlayer._best_child(self, node)
+            game._push_square_move(*node.move)
+            depth += 1
+        if node.untried:
+            move = node.untried.pop()
+            mover = game._turn
+            game._push_square_move(*move)
+            depth += 1
+            child = _Node(move, node, mover, game.get_zobrist_hash())
+            node.children.append(child)
+            child.visits = 1
+            node = child
+        snapshot, score = None, None
+        if game._state == "BLACK_WON":
+            score = 1.0
+        elif game._state == "RED_WON":
+            score = 0.0
+        elif node.untried is not None:                  # no legal move, score by captures like a rollout
+            score = 0.5 + (game._red_captured - game._black_captured) / 16
+        else:
+            snapshot = game.freeze()
+        for _ in range(depth):
+            game.pop_move()
+        return node, snapshot, score
+
+    def _best_child(self, node):
+        """Returns the child with the highest upper confidence bound."""
+        log_visits = math.log(node.visits)
+        exploration = self._exploration
+        return max(node.children, key=lambda child: child.wins / child.visits +
+                   exploration * math.sqrt(log_visits / child.visits))
+
+    def _rollouts(self, snapshots):
+        """Returns the black scores of rollouts from each snapshot, on the worker pool when there is more than one."""
+        if self._workers == 1:
+            return [_rollout_score(snapshot, self._rng, self._max_rollout_moves) for snapshot in snapshots]
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers)
+        futures = [self._pool.submit(_rollout_batch, snapshots[index:index + ROLLOUTS_PER_TASK],
+                                     self._rng.getrandbits(32), self._max_rollout_moves)
+                   for index in range(0, len(snapshots), ROLLOUTS_PER_TASK)]
+        return [score for future in futures for score in future.result()]
+
+    @staticmethod
+    def _backpropagate(node, black_score):
+        """Adds the score of a rollout to every node from the leaf up to the root, from each mover's point of view."""
+        while node is not None:
+            node.wins += black_score if node.mover == "BLACK" else 1.0 - black_score
+            node = node.parent
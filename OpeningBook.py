@@ -0,0 +1,173 @@
+# Description: An opening book for Hasami Shogi. Every game starts from the same position, so the first moves can be
+#              searched once, offline, instead of at the start of every game. build_opening_book walks the opening tree
+#              from the starting position to a given number of moves: wherever the player the book is playing for is
+#              to move, the SearchEngine picks the best reply at a fixed depth and only that reply is followed, and
+#              wherever the other player is to move every legal move is followed, so the book has an answer to any
+#              opening. This is done once as black and once as red. Each entry is 14 bytes: the Zobrist hash of the
+#              position (which also merges positions reached through different move orders), the start and finish
+#              squares of the reply and its search score. Entries are written sorted by hash, so the OpeningBook class
+#              can memory-map the file on first use and find a position by binary search without reading the rest.
+#              Run "python OpeningBook.py build opening.hsob --depth 4" to build a book and "python OpeningBook.py show
+#              opening.hsob" to print its size and first move.
+
+import argparse
+import mmap
+import struct
+import time
+
+from HasamiShogiGame import HasamiShogiGame, SQUARE_NAMES, SQUARE_INDEX
+from SearchEngine import SearchEngine
+
+MAGIC = b"HSOB\x01"                                     # file type and format version at the start of the file
+ENTRY = struct.Struct("<QBBi")                          # Zobrist hash, start square, finish square, search score
+
+
+def _add_replies(game, engine, entries, color, depth, seen):
+    """Adds the best reply of color to every position of the opening tree below game, depth moves deep."""
+    key = game.get_zobrist_hash()
+    if depth == 0 or game._state != "UNFINISHED" or (key, depth) in seen:
+        return
+    seen.add((key, depth))
+    if game._turn == color:
+        if key not in entries:
+            start, finish = engine.search(game)
+            entries[key] = (SQUARE_INDEX[start], SQUARE_INDEX[finish], engine.get_stats()["score"])
+        moves = [entries[key][:2]]
+    else:
+        moves = game._legal_square_moves()
+    for start, finish in moves:
+        game._push_square_move(start, finish)
+        _add_replies(game, engine, entries, color, depth - 1, seen)
+        game.pop_move()
+    return
+
+
+def build_opening_book(depth=4, search_depth=3, progress=None):
+    """Returns a dictionary of hash -> (start square, finish square, score) for both colors, depth moves deep."""
+    engine = SearchEngine(time_limit_ms=float("inf"), max_depth=search_depth)
+    entries = {}
+    for color in ("BLACK", "RED"):
+        _add_replies(HasamiShogiGame(), engine, entries, color, depth, set())
+        if progress is not None:
+            progress("%d positions after the %s replies" % (len(entries), color.lower()))
+    return entries
+
+
+def write_opening_book(path, entries):
+    """Writes the entries made by build_opening_book to a book file, sorted by hash."""
+    with open(path, "wb") as book_file:
+        book_file.write(MAGIC)
+        for key in sorted(entries):
+            book_file.write(ENTRY.pack(key, *entries[key]))
+
+
+class OpeningBook:
+    """Looks up opening replies in a book file, memory-mapped on first use."""
+
+    def __init__(self, path):
+        """Initialize all private data members. The file is only opened when the first position is looked up."""
+        self._path = path
+        self._file = None
+        self._entries = None
+        self._num_entries = 0
+        self._probes = 0
+        self._hits = 0
+
+    def _open(self):
+        """Maps the book file into memory and checks its header."""
+        self._file = open(self._path, "rb")
+        self._entries = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._entries[:len(MAGIC)] != MAGIC:
+            OpeningBook.close(self)
+            raise ValueError("%s is not a Hasami Shogi opening book" % self._path)
+        self._num_entries = (len(self._entries) - len(MAGIC)) // ENTRY.size
+        return
+
+    def _find(self, key):
+        """Returns the (start square, finish square, score) stored for a hash, or None."""
+        if self._entries is None:
+            OpeningBook._open(self)
+        low, high = 0, self._num_entries
+        while low < high:                               # binary search over the sorted entries
+            middle = (low + high) // 2
+            entry = ENTRY.unpack_from(self._entries, len(MAGIC) + middle * ENTRY.size)
+            if entry[0] < key:
+                low = middle + 1
+            elif entry[0] > key:
+                high = middle
+            else:
+                return entry[1:]
+        return None
+
+    def lookup(self, game):
+        """Returns the book reply for the player to move as a (start, finish) pair, or None if it has none."""
+        self._probes += 1
+        if game._state != "UNFINISHED":
+            return None
+        entry = OpeningBook._find(self, game.get_zobrist_hash())
+        if entry is None or game._validate_move(entry[0], entry[1]) is not True:   # a hash collision isn't a reply
+            return None
+        self._hits += 1
+        return SQUARE_NAMES[entry[0]], SQUARE_NAMES[entry[1]]
+
+    def __len__(self):
+        """Returns the number of positions in the book."""
+        if self._entries is None:
+            OpeningBook._open(self)
+        return self._num_entries
+
+    def get_stats(self):
+        """Returns the number of positions looked up and how many of them were in the book."""
+        return {"probes": self._probes, "hits": self._hits}
+
+    def close(self):
+        """Unmaps and closes the file, if it was opened."""
+        if self._entries is not None:
+            self._entries.close()
+            self._entries = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        """Returns the book for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the file at the end of a with statement."""
+        self.close()
+
+    def __getstate__(self):
+        """Leaves the open file out when the book is sent to another process, which maps it again itself."""
+        state = dict(self.__dict__)
+        state["_file"], state["_entries"] = None, None
+        return state
+
+
+def main():
+    """Parses the command line and builds an opening book or prints what one holds."""
+    parser = argparse.ArgumentParser(description="Build and read a Hasami Shogi opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="search the opening and write the book")
+    build_parser.add_argument("book")
+    build_parser.add_argument("--depth", type=int, default=4, help="number of moves covered from the start")
+    build_parser.add_argument("--search-depth", type=int, default=3, help="depth of the search for each reply")
+    show_parser = commands.add_parser("show", help="print the number of positions and the first move")
+    show_parser.add_argument("book")
+    args = parser.parse_args()
+    if args.command == "build":
+        start_time = time.perf_counter()
+        entries = build_opening_book(args.depth, args.search_depth,
+                                     lambda message: print("%7.1f s  %s" % (time.perf_counter() - start_time, message)))
+        write_opening_book(args.book, entries)
+        print("%d positions written in %.1f s" % (len(entries), time.perf_counter() - start_time))
+    else:
+        with OpeningBook(args.book) as book:
+            print("%d positions" % len(book))
+            move = book.lookup(HasamiShogiGame())
+            if move is not None:
+                print("first move %s-%s" % move)
+
+
+if __name__ == "__main__":
+    main()
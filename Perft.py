@@ -0,0 +1,172 @@
+# Description: Perft (performance test) for the HasamiShogiGame rules engine. perft counts the positions reached after
+#              exactly N moves from a position by walking every legal move with push_move and pop_move, so it runs the
+#              move generator and the capture and win checks at every node. reference_perft counts the same tree the
+#              slow way, trying all 81 x 81 square pairs with make_move on a copy of the position, so the two can be
+#              compared to catch a move generator or capture rule that has drifted. POSITIONS holds the starting
+#              position and a few hand-made ones that exercise the corner captures and captures of several pieces in
+#              each direction, and KNOWN_COUNTS holds their node counts for regression checks. Run with "python
+#              Perft.py --depth 3" for the starting position, "--position corners" or a hex position from to_bytes for
+#              another one, "--divide" for the count below each first move and "--check" to test every known count.
+
+import argparse
+import sys
+import time
+
+from HasamiShogiGame import HasamiShogiGame, SQUARE_NAMES, STATE_CODES
+
+CELL_CODES = {".": 0, "b": 1, "r": 2}
+
+POSITIONS = {
+    "start": (("rrrrrrrrr",
+               ".........",
+               ".........",
+               ".........",
+               ".........",
+               ".........",
+               ".........",
+               ".........",
+               "bbbbbbbbb"), "BLACK"),
+    "corners": (("r.b....br",                         # a lone piece in each corner with one partner in place
+                 "b........",                         # and a move completing the capture from each direction
+                 ".........",
+                 ".........",
+                 "r...b...b",
+                 ".........",
+                 ".........",
+                 "........r",
+                 "br....r.b"), "BLACK"),
+    "multi_capture": (("....b....",                   # black i5-e5 captures the lines of red pieces above, to
+                       "....r....",                   # the left and to the right of e5 at once
+                       "....r....",
+                       "....r....",
+                       "brrr.rrrb",
+                       ".........",
+                       ".........",
+                       ".........",
+                       "....b...."), "BLACK"),
+    "red_to_move": (("r...r...r",
+                     "....b....",
+                     "..b...b..",
+                     "r.......r",
+                     ".b.....b.",
+                     ".........",
+                     "b.......b",
+                     ".........",
+                     "..b...b.."), "RED"),
+}
+
+KNOWN_COUNTS = {
+    "start": (63, 3717, 254219, 16599273),            # counts after 1, 2, 3 and 4 moves
+    "corners": (61, 2977, 190621, 9831832),
+    "multi_capture": (36, 2738, 103600, 8406869),
+    "red_to_move": (38, 4120, 158660, 16558440),
+}
+
+
+def position_from_rows(rows, turn="BLACK"):
+    """Returns a new game set up from nine rows of ".", "b" and "r", counting missing pieces as captured."""
+    cells = "".join(rows)
+    squares = 0
+    for square, cell in enumerate(cells):
+        squares |= CELL_CODES[cell] << (2 * square)
+    flags = (1 if turn == "RED" else 0) | STATE_CODES["UNFINISHED"] << 1
+    data = squares.to_bytes(21, "little") + bytes((flags, 9 - cells.count("r"), 9 - cells.count("b")))
+    return HasamiShogiGame.from_bytes(data)
+
+
+def load_position(name):
+    """Returns a new game in one of the named POSITIONS, or in a position given as the hex of to_bytes."""
+    if name in POSITIONS:
+        return position_from_rows(*POSITIONS[name])
+    return HasamiShogiGame.from_bytes(bytes.fromhex(name))
+
+
+def perft(game, depth):
+    """Returns the number of positions reached after exactly depth moves, using the move generator."""
+    moves = game._legal_square_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1      # no need to make the moves of the last ply to count them
+    nodes = 0
+    for start, finish in moves:
+        game._push_square_move(start, finish)
+        nodes += perft(game, depth - 1)
+        game.pop_move()
+    return nodes
+
+
+def divide(game, depth):
+    """Returns the perft count below each legal move of the position, keyed by the move in notation."""
+    counts = {}
+    for start, finish in game._legal_square_moves():
+        game._push_square_move(start, finish)
+        counts[SQUARE_NAMES[start] + SQUARE_NAMES[finish]] = perft(game, depth - 1)
+        game.pop_move()
+    return counts
+
+
+def reference_perft(game, depth):
+    """Returns the same count as perft by trying every pair of squares with make_move on copies of the position."""
+    if depth == 0:
+        return 1
+    position = game.to_bytes()
+    player = game.get_active_player()
+    nodes = 0
+    for start in SQUARE_NAMES:
+        if game.get_square_occupant(start) != player:  # make_move would turn down every move from here anyway
+            continue
+        for finish in SQUARE_NAMES:
+            child = HasamiShogiGame.from_bytes(position)
+            if child.make_move(start, finish):
+                nodes += reference_perft(child, depth - 1)
+    return nodes
+
+
+def check_known_counts(max_nodes=20000000):
+    """Compares perft with KNOWN_COUNTS up to max_nodes per count and returns the list of mismatches."""
+    mismatches = []
+    for name, counts in KNOWN_COUNTS.items():
+        for depth, expected in enumerate(counts, 1):
+            if expected > max_nodes:
+                break
+            nodes = perft(load_position(name), depth)
+            if nodes != expected:
+                mismatches.append((name, depth, expected, nodes))
+    return mismatches
+
+
+def main():
+    """Parses the command line and prints perft counts."""
+    parser = argparse.ArgumentParser(description="Count the positions reached after N moves in Hasami Shogi.")
+    parser.add_argument("--depth", type=int, default=3, help="number of moves to look ahead")
+    parser.add_argument("--position", default="start", help="one of %s, or the hex of to_bytes" % ", ".join(POSITIONS))
+    parser.add_argument("--divide", action="store_true", help="print the count below each first move")
+    parser.add_argument("--reference", action="store_true", help="also count with the slow make_move reference")
+    parser.add_argument("--check", action="store_true", help="compare every position with its known counts")
+    args = parser.parse_args()
+    if args.check:
+        mismatches = check_known_counts()
+        for name, depth, expected, nodes in mismatches:
+            print("%s depth %d: expected %d, got %d" % (name, depth, expected, nodes))
+        print("%d mismatches" % len(mismatches))
+        sys.exit(1 if mismatches else 0)
+    game = load_position(args.position)
+    start_time = time.perf_counter()
+    if args.divide:
+        counts = divide(game, args.depth)
+        for move in sorted(counts):
+            print("%s %d" % (move, counts[move]))
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(game, args.depth)
+    elapsed = time.perf_counter() - start_time
+    print("perft(%d) = %d in %.2f s (%.0f nodes/sec)" % (args.depth, nodes, elapsed, nodes / elapsed))
+    if args.reference:
+        reference_nodes = reference_perft(game, args.depth)
+        print("reference perft(%d) = %d (%s)" % (args.depth, reference_nodes,
+                                                 "match" if reference_nodes == nodes else "MISMATCH"))
+        if reference_nodes != nodes:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
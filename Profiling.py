@@ -0,0 +1,141 @@
+# Description: A PhaseProfiler class is created to count the calls into each phase of a HasamiShogiGame move and the
+#              time spent in them: parsing the squares, _validate_start_finish, _validate_continuity, _check_capture and
+#              the ray scans it runs in each direction, _check_for_win, move generation (counted per rank or file, as
+#              legal_moves and iter_legal_moves both go through _line_moves) and rendering. The class calls its helpers
+#              through the class (HasamiShogiGame._check_capture(self, ...)) and parses squares through the module's
+#              parse_square, so enabling the profiler swaps timing wrappers into those places and disabling it puts the
+#              original functions back. While it is off nothing is wrapped at all, so it costs nothing. Times are
+#              inclusive: a phase's time includes the phases it calls, as _check_capture includes the ray scans and
+#              _check_for_win. The counters can be read as a dictionary or as Prometheus text. Run "python Profiling.py"
+#              to profile the replay of a random game corpus and print the share of each phase.
+
+import argparse
+import time
+
+import HasamiShogiGame as rules
+from HasamiShogiGame import HasamiShogiGame
+
+PHASES = (("parse", rules, "parse_square"),
+          ("validate_start_finish", HasamiShogiGame, "_validate_start_finish"),
+          ("validate_continuity", HasamiShogiGame, "_validate_continuity"),
+          ("check_capture", HasamiShogiGame, "_check_capture"),
+          ("capture_up", HasamiShogiGame, "_up_check"),
+          ("capture_down", HasamiShogiGame, "_down_check"),
+          ("capture_left", HasamiShogiGame, "_left_check"),
+          ("capture_right", HasamiShogiGame, "_right_check"),
+          ("check_for_win", HasamiShogiGame, "_check_for_win"),
+          ("move_generation", HasamiShogiGame, "_line_moves"),   # one call per rank or file
+          ("render", HasamiShogiGame, "_display_board"))
+
+
+def _timed(function, counter):
+    """Returns a wrapper around function that adds one call and its duration to a [calls, seconds] counter."""
+    perf_counter = time.perf_counter
+
+    def wrapper(*args):
+        start_time = perf_counter()
+        try:
+            return function(*args)
+        finally:
+            counter[1] += perf_counter() - start_time
+            counter[0] += 1
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+class PhaseProfiler:
+    """Represents call and time counters for the phases of HasamiShogiGame moves, switched on and off as a whole."""
+
+    _active = None                                      # the profiler whose wrappers are installed, if any
+
+    def __init__(self):
+        """Initialize all private data members with every counter at zero."""
+        self._counters = {name: [0, 0.0] for name, _, _ in PHASES}
+        self._originals = []
+
+    def enable(self):
+        """Installs the timing wrappers. Only one profiler can be enabled at a time."""
+        if PhaseProfiler._active is self:
+            return
+        if PhaseProfiler._active is not None:
+            raise RuntimeError("another PhaseProfiler is already enabled")
+        for name, owner, attribute in PHASES:
+            function = owner.__dict__[attribute]
+            self._originals.append((owner, attribute, function))
+            setattr(owner, attribute, _timed(function, self._counters[name]))
+        PhaseProfiler._active = self
+
+    def disable(self):
+        """Puts the original functions back, leaving the counters as they are."""
+        if PhaseProfiler._active is not self:
+            return
+        for owner, attribute, function in self._originals:
+            setattr(owner, attribute, function)
+        self._originals = []
+        PhaseProfiler._active = None
+
+    def is_enabled(self):
+        """Returns True while the profiler's wrappers are installed."""
+        return PhaseProfiler._active is self
+
+    def reset(self):
+        """Sets every counter back to zero."""
+        for counter in self._counters.values():
+            counter[0], counter[1] = 0, 0.0
+
+    def get_stats(self):
+        """Returns the calls and seconds counted for each phase."""
+        return {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in self._counters.items()}
+
+    def to_prometheus(self, prefix="hasami_shogi"):
+        """Returns the counters in the Prometheus text exposition format."""
+        lines = ["# HELP %s_phase_calls_total Calls into each phase of the rules engine." % prefix,
+                 "# TYPE %s_phase_calls_total counter" % prefix]
+        lines += ['%s_phase_calls_total{phase="%s"} %d' % (prefix, name, calls)
+                  for name, (calls, _) in self._counters.items()]
+        lines += ["# HELP %s_phase_seconds_total Time spent in each phase, including the phases it calls." % prefix,
+                  "# TYPE %s_phase_seconds_total counter" % prefix]
+        lines += ['%s_phase_seconds_total{phase="%s"} %.9f' % (prefix, name, seconds)
+                  for name, (_, seconds) in self._counters.items()]
+        return "\n".join(lines) + "\n"
+
+    def __enter__(self):
+        """Enables the profiler for the body of a with statement."""
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Disables the profiler at the end of a with statement."""
+        self.disable()
+
+
+def main():
+    """Parses the command line, replays a random corpus under the profiler and prints each phase's share."""
+    parser = argparse.ArgumentParser(description="Show where HasamiShogiGame spends its time, phase by phase.")
+    parser.add_argument("--games", type=int, default=50, help="number of random games in the corpus")
+    parser.add_argument("--seed", type=int, default=0, help="seed used to generate the corpus")
+    parser.add_argument("--prometheus", action="store_true", help="print the counters in Prometheus text format")
+    args = parser.parse_args()
+    import Benchmark                                    # only here, so GameServer doesn't load it with the profiler
+    corpus = Benchmark.generate_corpus(args.games, args.seed)
+    with PhaseProfiler() as profiler:
+        start_time = time.perf_counter()
+        for moves in corpus:
+            game = HasamiShogiGame()
+            for start, finish in moves:
+                game.make_move(start, finish)
+                game.legal_moves()
+        elapsed = time.perf_counter() - start_time
+    if args.prometheus:
+        print(profiler.to_prometheus(), end="")
+        return
+    print("%-22s %10s %10s %9s %7s" % ("phase", "calls", "total ms", "us/call", "share"))
+    for name, stats in profiler.get_stats().items():
+        calls, seconds = stats["calls"], stats["seconds"]
+        print("%-22s %10d %10.1f %9.2f %6.1f%%" % (name, calls, seconds * 1000, seconds / calls * 1e6 if calls else 0,
+                                                   100 * seconds / elapsed))
+    print("replay with legal_moves after every move took %.1f ms under the profiler" % (elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
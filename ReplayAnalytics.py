@@ -0,0 +1,268 @@
+# Description: A streaming pipeline that replays recorded Hasami Shogi games and folds them into statistics: capture
+#              rates, wins by side, game lengths and the most common captures. Each stage is a generator, so nothing is
+#              read before it is needed: read_records yields the moves of one game at a time from a GameArchive file,
+#              from SelfPlay's JSON results or from plain text lines of moves such as "i5-e5 a1-b1" (a file or stdin),
+#              replay_events replays a game on a headless HasamiShogiGame and yields an event for every move, capture,
+#              change of state (a win) and illegal move, and ReplayStats folds the events into totals whose size does
+#              not grow with the number of games. For large inputs, analyze spreads the games over a pool of worker
+#              processes: an archive is split into ranges of game numbers that each worker reads straight from the
+#              memory-mapped file, and a text stream is cut into chunks of games with a bounded number in flight. Each
+#              worker returns its own ReplayStats and they are merged as they come back. Run "python ReplayAnalytics.py
+#              games.hsga results.jsonl --workers 4", or pipe SelfPlay into "python ReplayAnalytics.py -".
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from GameArchive import MAGIC, GameArchiveReader
+from HasamiShogiGame import HasamiShogiGame, SQUARE_NAMES, parse_square
+
+CHUNK_GAMES = 250                                       # games sent to a worker in one task
+LONGEST_COUNTED = 400                                   # longer games are counted together in the length histogram
+TOP_CAPTURES = 10                                       # capturing moves listed in the summary
+
+
+def _parse_move(move):
+    """Returns a move written as "i5e5", "i5-e5" or ["i5", "e5"] as a (start, finish) pair."""
+    if not isinstance(move, str):
+        return move[0], move[1]
+    move = move.replace("-", "")
+    return move[:2], move[2:]
+
+
+def _text_records(lines):
+    """Yields the moves and starting position of the game on each line of SelfPlay JSON or plain text moves."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            record = json.loads(line)
+            start_position = bytes.fromhex(record["start"]) if record.get("start") else None
+            yield [_parse_move(move) for move in record["moves"]], start_position
+        else:
+            yield [_parse_move(move) for move in line.split()], None
+
+
+def _archive_records(path, first=0, stop=None):
+    """Yields the moves and starting position of the games numbered first to stop - 1 of an archive."""
+    with GameArchiveReader(path) as reader:
+        for number in range(first, len(reader) if stop is None else min(stop, len(reader))):
+            moves, _, start_position = reader.get_game(number)
+            yield moves, start_position
+
+
+def is_archive(path):
+    """Returns True if the path names a GameArchive data file."""
+    if path == "-":
+        return False
+    with open(path, "rb") as data_file:
+        return data_file.read(len(MAGIC)) == MAGIC
+
+
+def read_records(source):
+    """Yields (moves, start position or None) for every game in a file, an archive or stdin (given as "-")."""
+    if source == "-":
+        yield from _text_records(sys.stdin)
+    elif is_archive(source):
+        yield from _archive_records(source)
+    else:
+        with open(source) as text_file:
+            yield from _text_records(text_file)
+
+
+def replay_events(moves, start_position=None):
+    """Replays a game without rendering and yields a (kind, ply, player, detail) event for each thing that happens."""
+    # kinds: "move" (detail is (start, finish)), "capture" (the captured squares), "state" (the new state after the
+    # winning move), "illegal" (the move that couldn't be made, which ends the replay) and last "end" (final state)
+    if start_position is None:
+        game = HasamiShogiGame()
+    else:
+        game = HasamiShogiGame.from_bytes(start_position)
+    ply = 0
+    for start, finish in moves:
+        player = game._turn
+        opponent = game._red_bits if player == "BLACK" else game._black_bits
+        if not game.make_move_idx(parse_square(start), parse_square(finish)):
+            yield "illegal", ply, player, (start, finish)
+            break
+        ply += 1
+        yield "move", ply, player, (start, finish)
+        captured = opponent & ~(game._red_bits if player == "BLACK" else game._black_bits)
+        if captured:
+            yield "capture", ply, player, tuple(SQUARE_NAMES[square] for square in range(81)
+                                                if captured >> square & 1)
+        if game._state != "UNFINISHED":
+            yield "state", ply, player, game._state
+    yield "end", ply, None, game._state
+
+
+class ReplayStats:
+    """Represents running totals over replayed games, folded from their events in constant memory."""
+
+    def __init__(self):
+        """Initialize all private data members with every total at zero."""
+        self._games = 0
+        self._moves = 0
+        self._illegal_games = 0
+        self._moves_by_color = Counter()
+        self._captures_by_color = Counter()             # capturing moves, by the color that moved
+        self._pieces_by_color = Counter()               # pieces captured, by the color of the pieces like SelfPlay
+        self._results = Counter()
+        self._lengths = Counter()                       # games by number of moves, LONGEST_COUNTED and up together
+        self._capture_moves = Counter()                 # at most 81 x 81 distinct (start, finish) pairs
+        self._last_move = None
+
+    def add(self, event):
+        """Folds one event from replay_events into the totals."""
+        kind, ply, player, detail = event
+        if kind == "move":
+            self._moves += 1
+            self._moves_by_color[player] += 1
+            self._last_move = detail
+        elif kind == "capture":
+            self._captures_by_color[player] += 1
+            self._pieces_by_color["RED" if player == "BLACK" else "BLACK"] += len(detail)
+            self._capture_moves[self._last_move] += 1
+        elif kind == "illegal":
+            self._illegal_games += 1
+        elif kind == "end":
+            self._games += 1
+            self._results[detail] += 1
+            self._lengths[min(ply, LONGEST_COUNTED)] += 1
+        return
+
+    def add_game(self, moves, start_position=None):
+        """Replays one game and folds all of its events into the totals."""
+        for event in replay_events(moves, start_position):
+            ReplayStats.add(self, event)
+        return
+
+    def merge(self, other):
+        """Adds the totals of another ReplayStats, such as one returned by a worker, to these."""
+        self._games += other._games
+        self._moves += other._moves
+        self._illegal_games += other._illegal_games
+        for name in ("_moves_by_color", "_captures_by_color", "_pieces_by_color", "_results", "_lengths",
+                     "_capture_moves"):
+            getattr(self, name).update(getattr(other, name))
+        return
+
+    def get_stats(self):
+        """Returns the totals and the rates derived from them as a dictionary."""
+        stats = {"games": self._games,
+                 "moves": self._moves,
+                 "illegal_games": self._illegal_games,
+                 "black_won": self._results["BLACK_WON"],
+                 "red_won": self._results["RED_WON"],
+                 "unfinished": self._results["UNFINISHED"],
+                 "mean_length": self._moves / self._games if self._games else 0.0,
+                 "length_histogram": dict(sorted(self._lengths.items())),
+                 "most_common_captures": [[start + finish, count] for (start, finish), count   # ties by move
+                                          in sorted(self._capture_moves.items(), key=lambda item: (-item[1], item[0]))
+                                          [:TOP_CAPTURES]]}
+        for color in ("BLACK", "RED"):
+            name, moves = color.lower(), self._moves_by_color[color]
+            stats[name + "_win_rate"] = self._results[color + "_WON"] / self._games if self._games else 0.0
+            stats[name + "_captured"] = self._pieces_by_color[color]   # pieces of this color lost, as in SelfPlay
+            stats[name + "_capture_rate"] = self._captures_by_color[color] / moves if moves else 0.0
+        return stats
+
+
+def analyze_records(records):
+    """Returns the ReplayStats of an iterable of (moves, start position) records, replayed in this process."""
+    stats = ReplayStats()
+    for moves, start_position in records:
+        stats.add_game(moves, start_position)
+    return stats
+
+
+def _analyze_archive_range(path, first, stop):
+    """Returns the ReplayStats of a range of games of an archive, read by the worker itself."""
+    return analyze_records(_archive_records(path, first, stop))
+
+
+def _chunks(records, chunk_games):
+    """Yields lists of up to chunk_games records from an iterable of records."""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_games:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _tasks(sources, chunk_games):
+    """Yields the (function, arguments) of every task: a range of an archive or a chunk of text records."""
+    for source in sources:
+        if is_archive(source):
+            with GameArchiveReader(source) as reader:
+                num_games = len(reader)
+            for first in range(0, num_games, chunk_games):
+                yield _analyze_archive_range, (source, first, first + chunk_games)
+        else:
+            for chunk in _chunks(read_records(source), chunk_games):
+                yield analyze_records, (chunk,)
+
+
+def analyze(sources, workers=None, chunk_games=CHUNK_GAMES):
+    """Returns the ReplayStats of every game in the sources, replayed on a pool of worker processes."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:                                    # no pool needed, stream every game through this process
+        stats = ReplayStats()
+        for source in sources:
+            stats.merge(analyze_records(read_records(source)))
+        return stats
+    stats = ReplayStats()
+    max_in_flight = 2 * workers                         # keeps memory flat however long the input is
+    tasks = _tasks(sources, chunk_games)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for function, arguments in tasks:
+            pending.add(pool.submit(function, *arguments))
+            if len(pending) >= max_in_flight:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    stats.merge(future.result())
+        for future in concurrent.futures.as_completed(pending):
+            stats.merge(future.result())
+    return stats
+
+
+def main():
+    """Parses the command line, replays every game and prints the statistics."""
+    parser = argparse.ArgumentParser(description="Replay recorded Hasami Shogi games and summarize them.")
+    parser.add_argument("sources", nargs="*", default=["-"],
+                        help="GameArchive files, SelfPlay JSON results or text move lists (- for stdin)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--chunk-games", type=int, default=CHUNK_GAMES, help="games sent to a worker at a time")
+    parser.add_argument("--json", action="store_true", help="print the statistics as JSON")
+    args = parser.parse_args()
+    start_time = time.perf_counter()
+    stats = analyze(args.sources, args.workers, args.chunk_games).get_stats()
+    elapsed = time.perf_counter() - start_time
+    if args.json:
+        print(json.dumps(stats))
+        return
+    print("%d games, %d moves in %.2f s (%.0f moves/sec), %d stopped at an illegal move"
+          % (stats["games"], stats["moves"], elapsed, stats["moves"] / elapsed if elapsed > 0 else 0.0,
+             stats["illegal_games"]))
+    print("black won %d (%.1f%%), red won %d (%.1f%%), unfinished %d, mean length %.1f moves"
+          % (stats["black_won"], 100 * stats["black_win_rate"], stats["red_won"], 100 * stats["red_win_rate"],
+             stats["unfinished"], stats["mean_length"]))
+    for color in ("black", "red"):
+        print("%s lost %d pieces and captured on %.1f%% of its moves"
+              % (color, stats[color + "_captured"], 100 * stats[color + "_capture_rate"]))
+    print("most common captures: " + ", ".join("%s (%d)" % (move, count)
+                                               for move, count in stats["most_common_captures"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# Description: A SearchEngine class is created to choose moves for the player whose turn it is in a HasamiShogiGame. It
+#              runs an alpha-beta (negamax) search with iterative deepening: the position is searched to depth 1, then
+#              2, and so on until the time budget given in milliseconds runs out, and the best move of the deepest
+#              completed search is played. Moves are explored with push_move and pop_move on the game itself, and
+#              results are kept in a TranspositionTable keyed by the game's Zobrist hash. Moves are ordered with the
+#              best move remembered for the position first, then captures (largest first, found with the same ray scans
+#              as _up_check ... _right_check), then the remaining moves. The number of nodes searched, nodes per second
+#              and depth reached are reported after every search so the engine can be tuned against a latency target.
+#              The clock is read at every interior node, before its moves are ordered, and a new depth isn't started
+#              when the last one, grown by the rate the search has been growing at, clearly wouldn't finish in time. Win
+#              and loss scores are stored in the table counted from the node they belong to, not from the root, so they
+#              keep meaning the same distance when read back at another ply or in a later search. When an OpeningBook or
+#              a Tablebase is given, the position is looked up there first and a move found there is played without
+#              searching at all.
+
+import time
+
+from HasamiShogiGame import SQUARE_NAMES
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+WIN_SCORE = 100000                                      # score of a won position, reduced by the plies needed
+PIECE_SCORE = 100                                       # score of one captured piece
+MATE_SCORE = WIN_SCORE - 1000                           # scores beyond this are wins or losses in a number of plies
+MIN_DEPTH_GROWTH = 2.0                                  # least a depth is assumed to cost over the one before it
+MAX_DEPTH_GROWTH = 8.0                                  # most, since the first depths take too little time to measure
+FIRST_MEASURED_DEPTH = 3                                # growth is measured from this depth over the one before it
+
+
+def _score_to_table(score, ply):
+    """Returns a score as stored in the table: wins and losses counted in plies from the node rather than the root."""
+    if score > MATE_SCORE:
+        return score + ply
+    if score < -MATE_SCORE:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    """Returns a score read from the table as seen from the root, for a node the given number of plies deep."""
+    if score > MATE_SCORE:
+        return score - ply
+    if score < -MATE_SCORE:
+        return score + ply
+    return score
+
+
+class _SearchTimeout(Exception):
+    """Raised inside the search when the time budget has run out."""
+
+
+class SearchEngine:
+    """Represents an iterative deepening alpha-beta player for Hasami Shogi."""
+
+    def __init__(self, time_limit_ms=1000, max_depth=32, table=None, book=None, tablebase=None):
+        """Initialize all private data members. A new transposition table is made when none is given."""
+        self._time_limit_ms = time_limit_ms
+        self._max_depth = max_depth
+        self._table = table if table is not None else TranspositionTable()
+        self._book = book                               # OpeningBook and Tablebase, looked up before searching
+        self._tablebase = tablebase
+        self._source = "search"
+        self._deadline = 0.0
+        self._nodes = 0
+        self._depth_reached = 0
+        self._elapsed = 0.0
+        self._score = 0
+        self._best_move = None
+
+    def search(self, game):
+        """Returns the best move found for the player whose turn it is as a (start, finish) pair, or None."""
+        start_time = time.perf_counter()
+        self._deadline = start_time + self._time_limit_ms / 1000
+        self._nodes = 0
+        self._depth_reached = 0
+        self._score = 0
+        self._best_move = None
+        for source, lookup in (("book", self._book), ("tablebase", self._tablebase)):
+            move = lookup.lookup(game) if lookup is not None else None
+            if move is not None:
+                self._source = source
+                self._elapsed = time.perf_counter() - start_time
+                return move
+        self._source = "search"
+        stack_size = len(game._undo_stack)
+        root_moves = SearchEngine._ordered_moves(self, game, None)
+        if root_moves:
+            self._best_move = root_moves[0]             # something to play even if depth 1 does not finish
+        last_depth_time = None
+        growths = []
+        for depth in range(1, self._max_depth + 1):
+            if not root_moves:
+                break
+            depth_start = time.perf_counter()
+            try:
+                score, move = SearchEngine._search_root(self, game, root_moves, depth)
+            except _SearchTimeout:
+                while len(game._undo_stack) > stack_size:   # unwind the moves of the interrupted search
+                    game.pop_move()
+                break
+            self._score, self._best_move, self._depth_reached = score, move, depth
+            root_moves.remove(move)                     # search the best move first at the next depth
+            root_moves.insert(0, move)
+            if abs(score) >= WIN_SCORE - self._max_depth:   # forced win or loss found, deeper search won't change it
+                break
+            depth_end = time.perf_counter()
+            depth_time = depth_end - depth_start
+            if depth >= FIRST_MEASURED_DEPTH and last_depth_time:
+                growths.append(depth_time / last_depth_time)
+            growth = MIN_DEPTH_GROWTH
+            if growths:                                 # mean of the last two, so one slow depth doesn't stop the search
+                growth = min(max(growth, sum(growths[-2:]) / len(growths[-2:])), MAX_DEPTH_GROWTH)
+            if depth_end + depth_time * growth > self._deadline:   # the next depth would only be thrown away
+                break
+            last_depth_time = depth_time
+        self._elapsed = time.perf_counter() - start_time
+        if self._best_move is None:
+            return None
+        return SQUARE_NAMES[self._best_move[0]], SQUARE_NAMES[self._best_move[1]]
+
+    def get_stats(self):
+        """Returns the nodes searched, nodes per second, depth reached, time used and score of the last search."""
+        return {"source": self._source,                 # "book", "tablebase" or "search"
+                "nodes": self._nodes,
+                "nodes_per_second": self._nodes / self._elapsed if self._elapsed > 0 else 0.0,
+                "depth": self._depth_reached,
+                "elapsed_ms": self._elapsed * 1000,
+                "score": self._score}
+
+    def _search_root(self, game, moves, depth):
+        """Searches every root move to the given depth and returns the best score and move."""
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        best_move = moves[0]
+        for start, finish in moves:
+            game._push_square_move(start, finish)
+            score = -SearchEngine._negamax(self, game, depth - 1, -beta, -alpha, 1)
+            game.pop_move()
+            if score > alpha:
+                alpha, best_move = score, (start, finish)
+        self._table.store(game.get_zobrist_hash(), depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def _negamax(self, game, depth, alpha, beta, ply):
+        """Returns the score of the position for the player whose turn it is, searched to the given depth."""
+        self._nodes += 1
+        if game._state != "UNFINISHED":                 # the previous move won, so the player to move has lost
+            return ply - WIN_SCORE
+        if depth == 0:
+            return SearchEngine._evaluate(game)
+        if time.perf_counter() > self._deadline:        # every interior node, before the cost of ordering its moves
+            raise _SearchTimeout
+        key = game.get_zobrist_hash()
+        entry = self._table.probe(key)
+        table_move = None
+        if entry is not None:
+            entry_depth, value, flag, table_move = entry
+            value = _score_from_table(value, ply)
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return value
+                elif flag == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                elif flag == UPPER_BOUND:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+        moves = SearchEngine._ordered_moves(self, game, table_move)
+        if not moves:
+            return SearchEngine._evaluate(game)
+        original_alpha = alpha
+        best_score, best_move = -WIN_SCORE - 1, None
+        for start, finish in moves:
+            game._push_square_move(start, finish)
+            score = -SearchEngine._negamax(self, game, depth - 1, -beta, -alpha, ply + 1)
+            game.pop_move()
+            if score > best_score:
+                best_score, best_move = score, (start, finish)
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self._table.store(key, depth, _score_to_table(best_score, ply), flag, best_move)
+        return best_score
+
+    def _ordered_moves(self, game, table_move):
+        """Returns the legal moves with the remembered best move first, then captures by size, then the rest."""
+        captures = []
+        quiet = []
+        table_move_is_legal = False
+        for move in game._legal_square_moves():
+            if move == table_move:                      # a hash collision could remember a move that isn't legal here
+                table_move_is_legal = True
+                continue
+            num_captured = game._capture_mask(move[0], move[1]).bit_count()
+            if num_captured:
+                captures.append((num_captured, move))
+            else:
+                quiet.append(move)
+        captures.sort(key=lambda capture: -capture[0])
+        ordered = [move for _, move in captures] + quiet
+        if table_move_is_legal:
+            ordered.insert(0, table_move)
+        return ordered
+
+    @staticmethod
+    def _evaluate(game):
+        """Returns the material balance from the point of view of the player whose turn it is."""
+        if game._turn == "BLACK":
+            return (game._red_captured - game._black_captured) * PIECE_SCORE
+        return (game._black_captured - game._red_captured) * PIECE_SCORE
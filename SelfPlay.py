@@ -0,0 +1,171 @@
+# Description: Batch self-play for HasamiShogiGame. Full games are played between two move policies (random, greedy
+#              capture, the SearchEngine or the MCTSPlayer) and spread over a pool of worker processes. run_self_play is
+#              a generator that keeps a bounded number of games in flight and yields each result as soon as its game
+#              finishes, so callers can stream results to disk while the batch is still running. Every game gets its own
+#              seed and its own copy of each policy (a new engine, tree and table), so a batch can be replayed exactly,
+#              with or without a pool. Run with "python SelfPlay.py --games 100 --workers 4" to write one JSON result
+#              per line to stdout and a summary with games per second to stderr.
+
+import argparse
+import concurrent.futures
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+from HasamiShogiGame import HasamiShogiGame
+from MCTSPlayer import MCTSPlayer
+from SearchEngine import SearchEngine
+
+
+class RandomPolicy:
+    """Plays a random legal move."""
+
+    def choose_move(self, game, rng):
+        """Returns a random legal move for the player whose turn it is, or None if there is none."""
+        moves = game.legal_moves()
+        if not moves:
+            return None
+        return rng.choice(moves)
+
+
+class GreedyCapturePolicy:
+    """Plays the move that captures the most pieces, choosing at random between equally good moves."""
+
+    def choose_move(self, game, rng):
+        """Returns a legal move capturing as many pieces as possible, or None if there is no legal move."""
+        captures = game.capturing_moves()               # largest captures first
+        if not captures:
+            moves = game.legal_moves()
+            return rng.choice(moves) if moves else None
+        start, finish, _ = rng.choice([move for move in captures if move[2] == captures[0][2]])
+        return start, finish
+
+
+class SearchPolicy:
+    """Plays the move chosen by a SearchEngine with a fixed time budget per move."""
+
+    def __init__(self, time_limit_ms=50, max_depth=32):
+        """Initialize all private data members. The engine itself is made in the worker that plays the game."""
+        self._time_limit_ms = time_limit_ms
+        self._max_depth = max_depth
+        self._engine = None
+
+    def choose_move(self, game, rng):
+        """Returns the move found by the search engine, or None if there is no legal move."""
+        if self._engine is None:
+            self._engine = SearchEngine(self._time_limit_ms, self._max_depth)
+        return self._engine.search(game)
+
+    def __getstate__(self):
+        """Leaves the engine and its table out when the policy is copied for a game or sent to a worker."""
+        return {"_time_limit_ms": self._time_limit_ms, "_max_depth": self._max_depth, "_engine": None}
+
+
+class MCTSPolicy:
+    """Plays the move chosen by an MCTSPlayer with a fixed number of iterations per move."""
+
+    def __init__(self, iterations=500):
+        """Initialize all private data members. The player is made in the worker that plays the game."""
+        self._iterations = iterations
+        self._player = None
+
+    def choose_move(self, game, rng):
+        """Returns the move found by tree search, or None if there is no legal move."""
+        if self._player is None:
+            self._player = MCTSPlayer(self._iterations, seed=rng.getrandbits(32))
+        return self._player.search(game)
+
+    def __getstate__(self):
+        """Leaves the player and its tree out when the policy is copied for a game or sent to a worker."""
+        return {"_iterations": self._iterations, "_player": None}
+
+
+POLICIES = {"random": RandomPolicy, "greedy": GreedyCapturePolicy, "search": SearchPolicy, "mcts": MCTSPolicy}
+
+
+def play_game(game_index, seed, black_policy, red_policy, max_moves=400):
+    """Plays one game between two policies and returns its result as a dictionary."""
+    rng = random.Random(seed)
+    black_policy, red_policy = copy.copy(black_policy), copy.copy(red_policy)   # fresh engines, as in a worker
+    game = HasamiShogiGame()
+    moves = []
+    start_time = time.perf_counter()
+    while game.get_game_state() == "UNFINISHED" and len(moves) < max_moves:
+        policy = black_policy if game.get_active_player() == "BLACK" else red_policy
+        move = policy.choose_move(game, rng)
+        if move is None:                                # the player to move has no legal move
+            break
+        game.make_move(move[0], move[1])
+        moves.append(move[0] + move[1])
+    return {"game": game_index,
+            "seed": seed,
+            "state": game.get_game_state(),
+            "num_moves": len(moves),
+            "red_captured": game.get_num_captured_pieces("RED"),
+            "black_captured": game.get_num_captured_pieces("BLACK"),
+            "seconds": time.perf_counter() - start_time,
+            "moves": moves}
+
+
+def run_self_play(num_games, black_policy, red_policy, workers=None, seed=0, max_moves=400):
+    """Plays a batch of games on a process pool and yields each result as soon as its game finishes."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    seeds = random.Random(seed)
+    if workers == 1:                                    # no pool needed, play the games in this process
+        for game_index in range(num_games):
+            yield play_game(game_index, seeds.getrandbits(32), black_policy, red_policy, max_moves)
+        return
+    max_in_flight = 4 * workers                         # keeps memory flat however many games are asked for
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        game_index = 0
+        while game_index < num_games or pending:
+            while game_index < num_games and len(pending) < max_in_flight:
+                pending.add(pool.submit(play_game, game_index, seeds.getrandbits(32), black_policy, red_policy,
+                                        max_moves))
+                game_index += 1
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def make_policy(name, search_ms, mcts_iterations=500):
+    """Returns the policy with the given name."""
+    if name == "search":
+        return SearchPolicy(search_ms)
+    if name == "mcts":
+        return MCTSPolicy(mcts_iterations)
+    return POLICIES[name]()
+
+
+def main():
+    """Parses the command line, plays the games and prints each result followed by a summary."""
+    parser = argparse.ArgumentParser(description="Play batches of HasamiShogiGame games between move policies.")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--black", choices=sorted(POLICIES), default="random", help="policy for the black player")
+    parser.add_argument("--red", choices=sorted(POLICIES), default="random", help="policy for the red player")
+    parser.add_argument("--search-ms", type=int, default=50, help="time per move for the search policy")
+    parser.add_argument("--mcts-iterations", type=int, default=500, help="iterations per move for the mcts policy")
+    parser.add_argument("--max-moves", type=int, default=400, help="moves after which a game is abandoned")
+    parser.add_argument("--seed", type=int, default=0, help="seed the per-game seeds are drawn from")
+    args = parser.parse_args()
+    black_policy = make_policy(args.black, args.search_ms, args.mcts_iterations)
+    red_policy = make_policy(args.red, args.search_ms, args.mcts_iterations)
+    states = {"BLACK_WON": 0, "RED_WON": 0, "UNFINISHED": 0}
+    start_time = time.perf_counter()
+    for result in run_self_play(args.games, black_policy, red_policy, args.workers, args.seed, args.max_moves):
+        states[result["state"]] += 1
+        print(json.dumps(result))
+    elapsed = time.perf_counter() - start_time
+    print("%d games in %.2f s (%.1f games/sec): black won %d, red won %d, unfinished %d"
+          % (args.games, elapsed, args.games / elapsed, states["BLACK_WON"], states["RED_WON"],
+             states["UNFINISHED"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# Description: An endgame tablebase for Hasami Shogi positions with two pieces of each color left on the board. With
+#              seven pieces of each color captured, any capture wins, so every such position is either won or lost in a
+#              known number of moves, or drawn. build_tablebase solves all of them by retrograde analysis: first the
+#              positions where the player to move can capture at once are marked won in one move, then the positions
+#              where every move allows such a capture are marked lost in two, and from there each round marks the
+#              positions that can move into the last round's losses as won and the positions whose every move leads to a
+#              win for the other side as lost, until a round adds nothing. What is left is drawn. Colors play by the
+#              same rules, so positions are stored from the point of view of the player to move: one byte per pair of
+#              own squares and pair of opponent squares, holding the number of moves to the end of the game (odd when
+#              the player to move wins, even when it loses, 0 for a draw). The Tablebase class reads the file through a
+#              memory map opened on first use, so loading it costs nothing until a position is looked up. Run "python
+#              Tablebase.py build endgame.hstb" once (it takes a minute or two), then "python Tablebase.py probe
+#              endgame.hstb <hex of to_bytes>" to look up a position. Larger endgames are out of reach: three pieces
+#              against two is already a quarter of a billion positions.
+
+import argparse
+import mmap
+import sys
+import time
+
+from HasamiShogiGame import HasamiShogiGame, SQUARE_BITS, SQUARE_NAMES, RANK_MASKS, FILE_MASKS, RAY_MASKS, \
+    NEIGHBOR_BITS, UP, DOWN, LEFT, RIGHT, _adjacent_squares, _ray_capture, _slide_starts
+
+MAGIC = b"HSTB\x01"                                     # file type and format version at the start of the file
+PIECES = 2                                              # pieces of each color on the board in every stored position
+HEADER = MAGIC + bytes((PIECES, PIECES))
+CAPTURED = 9 - PIECES                                   # pieces of each color captured to get there
+PAIRS = tuple((low, high) for high in range(81) for low in range(high))     # rank of (low, high) is high*(high-1)/2+low
+NUM_PAIRS = len(PAIRS)
+TABLE_SIZE = NUM_PAIRS * NUM_PAIRS                      # own pair rank * NUM_PAIRS + opponent pair rank
+MAX_PLIES = 255                                         # longest distance a byte can hold
+SLIDE_SQUARES = tuple(tuple(tuple(square for square in range(81) if RAY_MASKS[direction][start] >> square & 1)[::step]
+                            for direction, step in ((UP, -1), (DOWN, 1), (LEFT, -1), (RIGHT, 1)))
+                      for start in range(81))           # squares along each ray, nearest first
+CROSS_MASKS = tuple(RANK_MASKS[square // 9] | FILE_MASKS[square % 9] for square in range(81))  # rank and file squares
+
+
+def _build_pair_ranks():
+    """Returns the rank in PAIRS of every pair of squares, indexed by 81 * first + second in either order."""
+    pair_ranks = [0] * (81 * 81)
+    for rank, (low, high) in enumerate(PAIRS):
+        pair_ranks[81 * low + high] = pair_ranks[81 * high + low] = rank
+    return pair_ranks
+
+
+PAIR_RANKS = _build_pair_ranks()
+
+
+def _captures(finish, own, opponent):
+    """Returns the opponent pieces captured by a piece of own that has just landed on finish."""
+    captured = 0
+    for direction in (UP, DOWN, LEFT, RIGHT):           # the square it came from is empty, so no direction is skipped
+        if opponent & NEIGHBOR_BITS[direction][finish]:
+            captured |= _ray_capture(direction, finish, own, opponent)
+    return captured
+
+
+def _can_capture(own_pair, own, opponent):
+    """Returns True if the player with pieces own can capture with its next move."""
+    occupied = own | opponent
+    landing = _adjacent_squares(opponent) & ~occupied & (CROSS_MASKS[own_pair[0]] | CROSS_MASKS[own_pair[1]])
+    while landing:
+        finish_bit = landing & -landing
+        finish = finish_bit.bit_length() - 1
+        for start in _slide_starts(finish, own, occupied):
+            if _captures(finish, own ^ SQUARE_BITS[start] ^ finish_bit, opponent):
+                return True
+        landing ^= finish_bit
+    return False
+
+
+def _quiet_children(own_pair, opponent_rank, occupied):
+    """Yields the index of the position after each move of own_pair, seen from the opponent, ignoring captures."""
+    first, second = own_pair
+    for start, other in ((first, second), (second, first)):
+        offset = 81 * other
+        for ray in SLIDE_SQUARES[start]:
+            for finish in ray:
+                if occupied >> finish & 1:
+                    break
+                yield opponent_rank * NUM_PAIRS + PAIR_RANKS[offset + finish]
+
+
+def _predecessors(own_pair, opponent_pair, own_rank):
+    """Yields the index of every position whose player to move reaches this one with a move that captures nothing."""
+    own = SQUARE_BITS[own_pair[0]] | SQUARE_BITS[own_pair[1]]
+    opponent = SQUARE_BITS[opponent_pair[0]] | SQUARE_BITS[opponent_pair[1]]
+    occupied = own | opponent
+    first, second = opponent_pair
+    for finish, other in ((first, second), (second, first)):
+        if _captures(finish, opponent, own):            # moving here would have captured, so this position never follows
+            continue
+        offset = 81 * other
+        for ray in SLIDE_SQUARES[finish]:
+            for start in ray:
+                if occupied >> start & 1:
+                    break
+                yield PAIR_RANKS[offset + start] * NUM_PAIRS + own_rank
+
+
+def _loses_every_move(values, index):
+    """Returns True if the position has a move and every move leads to a position won by the other player."""
+    own_pair, opponent_rank = PAIRS[index // NUM_PAIRS], index % NUM_PAIRS
+    opponent_pair = PAIRS[opponent_rank]
+    occupied = SQUARE_BITS[own_pair[0]] | SQUARE_BITS[own_pair[1]] | SQUARE_BITS[opponent_pair[0]] | \
+        SQUARE_BITS[opponent_pair[1]]
+    has_move = False
+    for child in _quiet_children(own_pair, opponent_rank, occupied):
+        if not values[child] & 1:                       # drawn or lost for the other player
+            return False
+        has_move = True
+    return has_move
+
+
+def build_tablebase(progress=None):
+    """Returns the values of every position as a bytearray of TABLE_SIZE, calling progress(message) along the way."""
+    values = bytearray(TABLE_SIZE)
+    valid = bytearray(TABLE_SIZE)                       # 1 where the four squares are all different
+    for own_rank, own_pair in enumerate(PAIRS):
+        own = SQUARE_BITS[own_pair[0]] | SQUARE_BITS[own_pair[1]]
+        base = own_rank * NUM_PAIRS
+        for opponent_rank, (third, fourth) in enumerate(PAIRS):
+            opponent = SQUARE_BITS[third] | SQUARE_BITS[fourth]
+            if own & opponent:
+                continue
+            valid[base + opponent_rank] = 1
+            if _can_capture(own_pair, own, opponent):
+                values[base + opponent_rank] = 1
+    if progress is not None:
+        progress("won in 1: %d positions" % values.count(1))
+    losses = [index for index in range(TABLE_SIZE) if valid[index] and not values[index] and
+              _loses_every_move(values, index)]
+    plies = 2
+    for index in losses:
+        values[index] = plies
+    while losses and plies + 1 < MAX_PLIES:
+        if progress is not None:
+            progress("lost in %d: %d positions" % (plies, len(losses)))
+        wins = []
+        for index in losses:                            # a move into a lost position wins
+            own_rank, opponent_rank = divmod(index, NUM_PAIRS)
+            for parent in _predecessors(PAIRS[own_rank], PAIRS[opponent_rank], own_rank):
+                if not values[parent]:
+                    values[parent] = plies + 1
+                    wins.append(parent)
+        if progress is not None:
+            progress("won in %d: %d positions" % (plies + 1, len(wins)))
+        losses = []
+        for index in wins:                              # a position can only become lost once its last move is won
+            own_rank, opponent_rank = divmod(index, NUM_PAIRS)
+            for parent in _predecessors(PAIRS[own_rank], PAIRS[opponent_rank], own_rank):
+                if not values[parent] and _loses_every_move(values, parent):
+                    values[parent] = plies + 2
+                    losses.append(parent)
+        plies += 2
+    return values
+
+
+def write_tablebase(path, values):
+    """Writes the values made by build_tablebase to a tablebase file."""
+    with open(path, "wb") as tablebase_file:
+        tablebase_file.write(HEADER)
+        tablebase_file.write(values)
+
+
+class Tablebase:
+    """Looks up positions with two pieces of each color in a tablebase file, memory-mapped on first use."""
+
+    def __init__(self, path):
+        """Initialize all private data members. The file is only opened when the first position is looked up."""
+        self._path = path
+        self._file = None
+        self._values = None
+        self._probes = 0
+        self._hits = 0
+
+    def _open(self):
+        """Maps the tablebase file into memory and checks its header."""
+        self._file = open(self._path, "rb")
+        self._values = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._values[:len(HEADER)] != HEADER or len(self._values) != len(HEADER) + TABLE_SIZE:
+            Tablebase.close(self)
+            raise ValueError("%s is not a Hasami Shogi tablebase" % self._path)
+        return
+
+    def _sides(self, game):
+        """Returns the pieces of the player to move and of the other player, or None if the position is not covered."""
+        if game._state != "UNFINISHED" or game._black_captured != CAPTURED or game._red_captured != CAPTURED:
+            return None
+        if game._black_bits.bit_count() != PIECES or game._red_bits.bit_count() != PIECES:
+            return None                                 # a position set up with from_bytes may not add up
+        if game._turn == "BLACK":
+            return game._black_bits, game._red_bits
+        return game._red_bits, game._black_bits
+
+    def _value(self, own, opponent):
+        """Returns the stored byte of a position given the pieces of the player to move and of the other player."""
+        if self._values is None:
+            Tablebase._open(self)
+        first = (own & -own).bit_length() - 1
+        third = (opponent & -opponent).bit_length() - 1
+        index = PAIR_RANKS[81 * first + own.bit_length() - 1] * NUM_PAIRS + \
+            PAIR_RANKS[81 * third + opponent.bit_length() - 1]
+        return self._values[len(HEADER) + index]
+
+    def probe(self, game):
+        """Returns ("WIN", moves), ("LOSS", moves) or ("DRAW", 0) for the player to move, or None if not covered."""
+        sides = Tablebase._sides(self, game)
+        self._probes += 1
+        if sides is None:
+            return None
+        self._hits += 1
+        value = Tablebase._value(self, *sides)
+        if not value:
+            return "DRAW", 0
+        return ("WIN" if value & 1 else "LOSS"), value
+
+    def lookup(self, game):
+        """Returns the best move for the player to move as a (start, finish) pair, or None if not covered."""
+        sides = Tablebase._sides(self, game)
+        self._probes += 1
+        if sides is None:
+            return None
+        own, opponent = sides
+        best_move, best_rank = None, None
+        for start, finish in game._legal_square_moves():
+            moved = own ^ SQUARE_BITS[start] ^ SQUARE_BITS[finish]
+            if _captures(finish, moved, opponent):
+                rank = (2, -1)                          # wins on the spot
+            else:
+                value = Tablebase._value(self, opponent, moved)
+                if not value:
+                    rank = (1, 0)
+                elif value & 1:                         # the other player wins, put it off as long as possible
+                    rank = (0, value)
+                else:
+                    rank = (2, -value - 1)
+            if best_rank is None or rank > best_rank:
+                best_move, best_rank = (start, finish), rank
+        if best_move is None:
+            return None
+        self._hits += 1
+        return SQUARE_NAMES[best_move[0]], SQUARE_NAMES[best_move[1]]
+
+    def get_stats(self):
+        """Returns the number of positions looked up and how many of them the tablebase covered."""
+        return {"probes": self._probes, "hits": self._hits}
+
+    def close(self):
+        """Unmaps and closes the file, if it was opened."""
+        if self._values is not None:
+            self._values.close()
+            self._values = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        """Returns the tablebase for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the file at the end of a with statement."""
+        self.close()
+
+    def __getstate__(self):
+        """Leaves the open file out when the tablebase is sent to another process, which maps it again itself."""
+        state = dict(self.__dict__)
+        state["_file"], state["_values"] = None, None
+        return state
+
+
+def main():
+    """Parses the command line and builds a tablebase or looks up a position in one."""
+    parser = argparse.ArgumentParser(description="Build and read the Hasami Shogi two-against-two tablebase.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="solve every position and write the tablebase")
+    build_parser.add_argument("tablebase")
+    probe_parser = commands.add_parser("probe", help="print the result and best move of a position")
+    probe_parser.add_argument("tablebase")
+    probe_parser.add_argument("position", help="hex of HasamiShogiGame.to_bytes")
+    args = parser.parse_args()
+    if args.command == "build":
+        start_time = time.perf_counter()
+        values = build_tablebase(lambda message: print("%7.1f s  %s" % (time.perf_counter() - start_time, message),
+                                                       file=sys.stderr))
+        write_tablebase(args.tablebase, values)
+        wins = sum(values.count(plies) for plies in range(1, MAX_PLIES + 1, 2))
+        losses = sum(values.count(plies) for plies in range(2, MAX_PLIES + 1, 2))
+        print("%d won, %d lost, longest %d moves, in %.1f s" % (wins, losses, max(values),
+                                                                time.perf_counter() - start_time))
+    else:
+        game = HasamiShogiGame.from_bytes(bytes.fromhex(args.position))
+        with Tablebase(args.tablebase) as tablebase:
+            result = tablebase.probe(game)
+            if result is None:
+                print("not covered: the tablebase holds positions with two pieces of each color")
+                sys.exit(1)
+            print("%s in %d" % result if result[1] else "DRAW")
+            move = tablebase.lookup(game)
+            if move is not None:
+                print("best move %s-%s" % move)
+
+
+if __name__ == "__main__":
+    main()
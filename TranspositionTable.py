@@ -0,0 +1,88 @@
+# Description: A TranspositionTable class is created to remember results computed for positions of a HasamiShogiGame,
+#              keyed by the Zobrist hash returned by get_zobrist_hash. Positions reached through different move orders
+#              share a hash, so a result only has to be computed once. The table is given a memory budget in bytes,
+#              which is turned into a fixed number of entries. When it is full, entries are replaced according to one
+#              of two policies: "depth" keeps one entry per slot and only replaces it with a result searched at least
+#              as deep, and "lru" keeps a single ordered table and evicts the least recently used entry. Hits, misses
+#              and evictions are counted so the table can be sized against real workloads.
+
+from collections import OrderedDict
+
+EXACT = 0                                               # value is the exact score of the position
+LOWER_BOUND = 1                                         # search failed high, the score is at least value
+UPPER_BOUND = 2                                         # search failed low, the score is at most value
+
+
+class TranspositionTable:
+    """Represents a fixed-size cache of position results keyed by Zobrist hash."""
+
+    ENTRY_BYTES = 160                                   # estimated size of one stored entry, including its key
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, policy="depth"):
+        """Initialize all private data members. Policy is either "depth" or "lru"."""
+        if policy not in ("depth", "lru"):
+            raise ValueError("policy must be 'depth' or 'lru', not %r" % (policy,))
+        self._policy = policy
+        self._capacity = max(1, max_bytes // TranspositionTable.ENTRY_BYTES)
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._size = 0
+        if policy == "depth":
+            self._slots = [None] * self._capacity       # each slot holds (key, depth, value, flag, move) or None
+        else:
+            self._entries = OrderedDict()               # key -> (depth, value, flag, move), oldest use first
+
+    def probe(self, key):
+        """Returns the (depth, value, flag, move) stored for a key, or None when the key is not in the table."""
+        if self._policy == "depth":
+            entry = self._slots[key % self._capacity]
+            if entry is not None and entry[0] == key:
+                self._hits += 1
+                return entry[1:]
+        else:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry
+        self._misses += 1
+        return None
+
+    def store(self, key, depth, value, flag=EXACT, move=None):
+        """Stores the result of a position searched to the given depth, replacing entries as the policy allows."""
+        if self._policy == "depth":
+            index = key % self._capacity
+            entry = self._slots[index]
+            if entry is None:
+                self._size += 1
+            elif entry[0] != key:
+                if entry[1] > depth:                    # keep the deeper result already in this slot
+                    return
+                self._evictions += 1
+            self._slots[index] = (key, depth, value, flag, move)
+            return
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        elif len(self._entries) >= self._capacity:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+        self._entries[key] = (depth, value, flag, move)
+        self._size = len(self._entries)
+
+    def clear(self):
+        """Removes every entry and resets the counters."""
+        if self._policy == "depth":
+            self._slots = [None] * self._capacity
+        else:
+            self._entries.clear()
+        self._size = self._hits = self._misses = self._evictions = 0
+
+    def get_stats(self):
+        """Returns the number of hits, misses, evictions and entries along with the capacity of the table."""
+        return {"hits": self._hits, "misses": self._misses, "evictions": self._evictions, "entries": self._size,
+                "capacity": self._capacity, "policy": self._policy}
+
+    def __len__(self):
+        """Returns the number of entries currently stored."""
+        return self._size
@@ -0,0 +1,256 @@
+# Description: Tests for HasamiShogiGame. Random sequences of moves, with captures and game-ending moves, are made with
+#              push_move and taken back with pop_move, checking that every position comes back exactly as it was, the
+#              threat map is checked against trying every move, input that isn't a square must be turned down without
+#              raising, and BatchHasamiShogi (when NumPy is installed) is played against HasamiShogiGame move for move.
+
+import importlib.util
+import random
+import unittest
+
+from HasamiShogiGame import HasamiShogiGame, SQUARE_BITS, SQUARE_NAMES, EMPTY_CELL, BLACK_CELL, RED_CELL, parse_square
+
+
+def snapshot(game):
+    """Returns everything about a position that pop_move has to restore."""
+    return game.to_bytes(), game.get_zobrist_hash(), game.legal_moves(), bytes(game._board)
+
+
+def board_matches_bitboards(game):
+    """Returns True if the printed board and the two bitboards hold the same pieces."""
+    for square in range(81):
+        if game._black_bits & SQUARE_BITS[square]:
+            expected = BLACK_CELL
+        elif game._red_bits & SQUARE_BITS[square]:
+            expected = RED_CELL
+        else:
+            expected = EMPTY_CELL
+        if game._board[square] != expected:
+            return False
+    return not game._black_bits & game._red_bits
+
+
+def scan_captures(game):
+    """Returns the capturing moves of the player to move as (start, finish, squares), by pushing and popping each."""
+    captures = []
+    for start, finish in game.legal_moves():
+        opponent = game._red_bits if game.get_active_player() == "BLACK" else game._black_bits
+        game.push_move(start, finish)
+        captured = opponent & ~(game._black_bits | game._red_bits)
+        game.pop_move()
+        if captured:
+            captures.append((start, finish, [SQUARE_NAMES[square] for square in range(81) if captured >> square & 1]))
+    return captures
+
+
+def scan_threats(game, color):
+    """Returns the squares of color's pieces that the other color could capture next, found with scan_captures."""
+    if game.get_active_player() == color:              # let the other color move in a copy of the position
+        data = bytearray(game.to_bytes())
+        data[21] ^= 1
+        game = HasamiShogiGame.from_bytes(bytes(data))
+    return sorted({square for _, _, captured in scan_captures(game) for square in captured})
+
+
+class PushPopTest(unittest.TestCase):
+    """Makes and unmakes random sequences of moves."""
+
+    def play_and_unwind(self, seed, max_moves=400, capture_rate=0.7):
+        """Pushes random moves, preferring captures so games get won, then pops them all. Returns what happened."""
+        rng = random.Random(seed)
+        game = HasamiShogiGame()
+        snapshots = []
+        num_captures = 0
+        while game.get_game_state() == "UNFINISHED" and len(snapshots) < max_moves:
+            captures = game.capturing_moves()
+            if captures and rng.random() < capture_rate:
+                start, finish, _ = rng.choice(captures)
+            else:
+                moves = game.legal_moves()
+                if not moves:
+                    break
+                start, finish = rng.choice(moves)
+            before = game.get_num_captured_pieces("BLACK") + game.get_num_captured_pieces("RED")
+            snapshots.append(snapshot(game))
+            self.assertTrue(game.push_move(start, finish))
+            self.assertTrue(board_matches_bitboards(game))
+            num_captures += game.get_num_captured_pieces("BLACK") + game.get_num_captured_pieces("RED") > before
+        final_state = game.get_game_state()
+        while snapshots:
+            self.assertTrue(game.pop_move())
+            self.assertEqual(snapshot(game), snapshots.pop())
+            self.assertTrue(board_matches_bitboards(game))
+        self.assertFalse(game.pop_move())
+        return num_captures, final_state
+
+    def test_random_sequences_unwind_exactly(self):
+        """Every position comes back after pops, including captures and won games."""
+        num_captures, num_won = 0, 0
+        for seed in range(40):
+            captures, final_state = self.play_and_unwind(seed)
+            num_captures += captures
+            num_won += final_state != "UNFINISHED"
+        self.assertGreater(num_captures, 0)
+        self.assertGreater(num_won, 0)
+
+    def test_quiet_sequences_unwind_exactly(self):
+        """Long sequences of mostly quiet moves unwind too."""
+        for seed in range(5):
+            self.play_and_unwind(1000 + seed, max_moves=150, capture_rate=0.0)
+
+    def test_push_rejects_illegal_moves(self):
+        """An illegal move is turned down and leaves nothing to pop."""
+        game = HasamiShogiGame()
+        before = snapshot(game)
+        self.assertFalse(game.push_move("a1", "b1"))    # red piece, black to move
+        self.assertFalse(game.push_move("i1", "h2"))    # diagonal
+        self.assertFalse(game.pop_move())
+        self.assertEqual(snapshot(game), before)
+
+    def test_make_move_clears_pushed_moves(self):
+        """A move made with make_move can't be popped and drops the pushed moves before it."""
+        game = HasamiShogiGame()
+        self.assertTrue(game.push_move("i1", "e1"))
+        self.assertTrue(game.make_move("a9", "b9"))
+        after = snapshot(game)
+        self.assertFalse(game.pop_move())
+        self.assertEqual(snapshot(game), after)
+        self.assertEqual(game.get_square_occupant("b9"), "RED")
+        self.assertEqual(game.get_active_player(), "BLACK")
+        before = snapshot(game)
+        self.assertTrue(game.push_move("e1", "e2"))
+        self.assertTrue(game.pop_move())
+        self.assertEqual(snapshot(game), before)
+        self.assertFalse(game.pop_move())
+
+
+class SquareParsingTest(unittest.TestCase):
+    """Passes squares that aren't squares to the methods that take them."""
+
+    NOT_SQUARES = ("j1", "a10", "a0", "", "a", None, [], ["i", "1"], 5, 1.0)
+
+    def test_rejects_what_is_not_a_square(self):
+        """make_move and push_move return False and get_square_occupant None, leaving the game untouched."""
+        game = HasamiShogiGame()
+        before = snapshot(game)
+        for square in self.NOT_SQUARES:
+            self.assertFalse(game.make_move(square, "e1"))
+            self.assertFalse(game.make_move("i1", square))
+            self.assertFalse(game.push_move(square, "e1"))
+            self.assertFalse(game.push_move("i1", square))
+            self.assertIsNone(game.get_square_occupant(square))
+            self.assertIsNone(parse_square(square))
+        self.assertFalse(game.pop_move())
+        self.assertEqual(snapshot(game), before)
+
+    def test_either_case(self):
+        """Squares are read in upper or lower case."""
+        game = HasamiShogiGame()
+        self.assertEqual(game.get_square_occupant("A1"), "RED")
+        self.assertEqual(game.get_square_occupant("i9"), "BLACK")
+        self.assertEqual(game.get_square_occupant("E5"), "NONE")
+        self.assertEqual(parse_square("C4"), parse_square("c4"))
+        self.assertTrue(game.push_move("I1", "e1"))
+        self.assertTrue(game.make_move("a9", "B9"))
+        self.assertEqual(game.get_square_occupant("e1"), "BLACK")
+        self.assertEqual(game.get_square_occupant("b9"), "RED")
+
+    def test_square_numbers(self):
+        """make_move_idx takes any integer type, such as a NumPy integer, but not bools or other numbers."""
+        game = HasamiShogiGame()
+        for start, finish in ((True, 9), (72.0, 63), (72, 81), (-9, 63), ("72", 63), (None, 63)):
+            self.assertFalse(game.make_move_idx(start, finish))
+        self.assertTrue(game.make_move_idx(72, 63))
+        if importlib.util.find_spec("numpy") is not None:
+            import numpy
+            self.assertTrue(game.make_move_idx(numpy.int64(0), numpy.uint8(9)))
+            self.assertEqual(game.get_square_occupant("b1"), "RED")
+
+
+class ThreatMapTest(unittest.TestCase):
+    """Compares the threat map with a scan of every move after mixed make_move, push_move and pop_move sequences."""
+
+    def assert_threats_match(self, game):
+        """Checks capturing_moves, capture_count and threatened_squares against scan_captures and scan_threats."""
+        captures = game.capturing_moves()
+        threatened = {color: game.threatened_squares(color) for color in ("BLACK", "RED")}
+        expected = {(start, finish): len(squares) for start, finish, squares in scan_captures(game)}
+        self.assertEqual(sorted(captures), sorted(move + (number,) for move, number in expected.items()))
+        numbers = [number for _, _, number in captures]
+        self.assertEqual(numbers, sorted(numbers, reverse=True))            # largest captures first
+        for start, finish in game.legal_moves():
+            self.assertEqual(game.capture_count(start, finish), expected.get((start, finish), 0))
+        for color in ("BLACK", "RED"):
+            self.assertEqual(sorted(threatened[color]), scan_threats(game, color))
+
+    def test_threat_map_matches_scan(self):
+        """The threat map agrees with trying every move, after makes, pushes and pops, with captures and wins."""
+        num_captures = num_won = 0
+        for seed in range(12):
+            rng = random.Random(seed)
+            game = HasamiShogiGame()
+            for _ in range(300):
+                if game.get_game_state() != "UNFINISHED":
+                    num_won += 1
+                    self.assertEqual(game.capturing_moves(), [])
+                    self.assertEqual(game.threatened_squares("BLACK"), [])
+                    if not game.pop_move():
+                        break
+                    continue
+                choice = rng.random()
+                if choice < 0.25 and game.pop_move():
+                    pass
+                else:
+                    captures = game.capturing_moves()
+                    if captures and rng.random() < 0.6:
+                        start, finish, _ = rng.choice(captures)
+                        num_captures += 1
+                    else:
+                        moves = game.legal_moves()
+                        if not moves:
+                            break
+                        start, finish = rng.choice(moves)
+                    if choice < 0.6:
+                        self.assertTrue(game.push_move(start, finish))
+                    else:
+                        self.assertTrue(game.make_move(start, finish))
+                self.assert_threats_match(game)
+        self.assertGreater(num_captures, 0)
+        self.assertGreater(num_won, 0)
+
+
+class BytesTest(unittest.TestCase):
+    """Saves and loads positions with to_bytes and from_bytes."""
+
+    def test_round_trip(self):
+        """A position loaded from its bytes is the same position, down to its hash and moves."""
+        rng = random.Random(2)
+        game = HasamiShogiGame()
+        for _ in range(120):
+            moves = game.legal_moves()
+            if not moves:
+                break
+            game.make_move(*rng.choice(moves))
+            loaded = HasamiShogiGame.from_bytes(game.to_bytes())
+            self.assertEqual(snapshot(loaded), snapshot(game))
+            self.assertTrue(board_matches_bitboards(loaded))
+            self.assertEqual(loaded.get_board_text(), game.get_board_text())
+
+    def test_rejects_bad_data(self):
+        """Data to_bytes could not have written raises ValueError."""
+        data = HasamiShogiGame().to_bytes()
+        for bad in (data[:23], data + b"\x00", b"\x03" + data[1:], data[:21] + b"\x06" + data[22:]):
+            with self.assertRaises(ValueError):
+                HasamiShogiGame.from_bytes(bad)
+
+@unittest.skipIf(importlib.util.find_spec("numpy") is None, "BatchHasamiShogi requires NumPy")
+class BatchCrossCheckTest(unittest.TestCase):
+    """Plays random games on BatchHasamiShogi and HasamiShogiGame side by side."""
+
+    def test_batch_matches_game(self):
+        """Both engines accept the same moves and reach the same positions, invalid moves included."""
+        from BatchHasamiShogi import cross_check
+        self.assertEqual(cross_check(num_games=20, num_moves=150, seed=1), 20 * 150)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+# Description: Tests for SearchEngine. The same random midgame positions are searched with a small and a large time
+#              budget, checking that the larger budget never stops at a shallower depth than the smaller one.
+
+import random
+import unittest
+
+from HasamiShogiGame import HasamiShogiGame
+from SearchEngine import SearchEngine
+
+
+def midgame_positions(seed, count):
+    """Returns unfinished positions reached by 10 to 60 random moves from the start."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = HasamiShogiGame()
+        for _ in range(rng.randrange(10, 60)):
+            moves = game.legal_moves()
+            if not moves:
+                break
+            game.make_move(*rng.choice(moves))
+        if game.get_game_state() == "UNFINISHED":
+            positions.append(game)
+    return positions
+
+
+class TimeBudgetTest(unittest.TestCase):
+    """Searches fixed positions with different time budgets."""
+
+    def test_larger_budget_searches_at_least_as_deep(self):
+        """A 200 ms search reaches at least the depth of a 10 ms search, and past depth 2."""
+        for game in midgame_positions(7, 4):
+            depths = []
+            for time_limit_ms in (10, 200):
+                engine = SearchEngine(time_limit_ms)
+                self.assertIsNotNone(engine.search(game))
+                depths.append(engine.get_stats()["depth"])
+            self.assertGreaterEqual(depths[1], depths[0])
+            self.assertGreater(depths[1], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()